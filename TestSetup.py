@@ -5,13 +5,24 @@ import math
 import os
 import time
 import json
+import random
+import tempfile
+import shutil
 import chipwhisperer as cw
 from chipwhisperer.capture.api.programmers import Programmer
 from typing import Optional, List, overload, Union, Any
 from NormalSerial import NormalSerial
 from glitch_params import GlitchControllerParams
+from param_order import measure_param_write_costs, estimate_reconfig_seconds, find_optimal_param_order
 from logging import Logger
 from collections import Counter
+from run_stats import required_sample_size_for_bound, wilson_interval, EtaEstimator
+from break_scheduler import AdaptiveBreakScheduler
+from break_executor import BreakExecutor, PrefetchingIterator
+from trace_store import TraceMemmapWriter, IndexedTraceStore, traces_to_float, write_segmented_traces, export_cwp
+from trace_stats import GroupedTraceStats, RunningTraceStats
+from trace_classifier import TraceClassifier, TraceLabel
+from adc_tuning import tune_adc_window
 # enum result:
 class TestResult(Enum):
     skipped = -2
@@ -83,7 +94,30 @@ class TestOptions:
                     logger_level = logging.INFO,
                     fw_image_path: Optional[str] = None,
                     programmer_args: dict[str, Any] = None, 
-                    no_program = False
+                    no_program = False,
+                    burst_size = 1,
+                    optimize_param_order = False,
+                    dry_run_sample = False,
+                    dry_run_confidence = 0.95,
+                    dry_run_margin = 0.01,
+                    dry_run_max_reset_rate = 0.01,
+                    adaptive_breaks = False,
+                    adaptive_break_window = 200,
+                    adaptive_break_reset_margin = 0.05,
+                    adaptive_break_latency_drift = 1.5,
+                    background_break_work = False,
+                    trace_dtype = "float32",
+                    online_trace_stats = False,
+                    classify_traces = False,
+                    trace_roi: Optional[list[int]] = None,
+                    trace_crash_correlation = 0.5,
+                    trace_anomaly_z = 4.0,
+                    store_interesting_traces = False,
+                    tune_adc_window = False,
+                    trace_segment_bytes = 64 * 1024 * 1024,
+                    lazy_cwp_export = True,
+                    store_normal_trace_fraction = 0.0,
+                    skip_unchanged_program = False
                     ):
         """
         
@@ -120,6 +154,29 @@ class TestOptions:
           - fw_image_path (`Optional[str]`) [default = `None`]: The firmware image path.
           - programmer_args (`dict[str, Any]`) [default = `None`]: Additional programmer arguments.
           - no_program (`bool`) [default = `False`]: Whether to disable programming the target.
+          - burst_size (`int`) [default = `1`]: The number of glitch attempts performed per target command. Values > 1 require the test to support burst mode (`iter_run`/`get_data`/`check_result` handling `self._current_burst_size` attempts at once).
+          - optimize_param_order (`bool`) [default = `False`]: Whether to measure the write cost of each glitch parameter before the run and reorder `param_order` to minimize the total reconfiguration time. Not applied when resuming a session with existing results.
+          - dry_run_sample (`bool`) [default = `False`]: Whether dry runs should try a random sample of the settings that won't be skipped (always including the first and last unskipped values of every parameter) instead of sweeping the whole grid. Each sampled setting is tried `burst_size` times.
+          - dry_run_confidence (`float`) [default = `0.95`]: The confidence level of the one-sided bounds used to size the dry run sample and for the stability verdict.
+          - dry_run_margin (`float`) [default = `0.01`]: How far below `dry_run_max_reset_rate` the reset rate may be for a sampled dry run to still be large enough to call the setup stable; the sample is sized for a reset rate of `dry_run_max_reset_rate - dry_run_margin` (at least 0). Must be above 0.
+          - dry_run_max_reset_rate (`float`) [default = `0.01`]: The reset rate above which a sampled dry run considers the setup unstable. Must be above 0.
+          - adaptive_breaks (`bool`) [default = `False`]: Whether to take breaks only when the rolling reset rate, response latency or clock lock degrade compared to the start of the run, instead of every `iter_before_*_break` tries. Breaks are between `small_break_seconds` and `very_big_break_seconds` long, depending on how fast the target recovers.
+          - adaptive_break_window (`int`) [default = `200`]: The number of tries in the rolling window used by adaptive breaks.
+          - adaptive_break_reset_margin (`float`) [default = `0.05`]: How much the rolling reset rate may rise above the baseline before an adaptive break is taken.
+          - adaptive_break_latency_drift (`float`) [default = `1.5`]: How many times slower than the baseline a try may get before an adaptive break is taken.
+          - background_break_work (`bool`) [default = `False`]: Whether to save the session, refresh the results summary and prefetch the next settings on a background thread during every break, instead of saving synchronously before big breaks.
+          - trace_dtype (`str`) [default = `'float32'`]: How `capture_sequence` stores traces on disk while capturing: `'float32'`, or `'int16'` for the raw ADC values.
+          - online_trace_stats (`bool`) [default = `False`]: Whether `capture_sequence` should only keep running per-sample mean/variance/min/max of the traces, grouped by result, instead of storing every trace. The stats are saved to `<capture>_stats.npz` and returned instead of the traces.
+          - classify_traces (`bool`) [default = `False`]: Whether to label each glitch attempt's power trace as normal, crashed or anomalous by comparing it to a reference profile. A dry run builds the reference from its normal traces (or use `set_trace_reference()`); crashed tries are handled as resets without waiting for `get_data()`. Requires `should_block_and_check_for_reset`.
+          - trace_roi (`Optional[list[int]]`) [default = `None`]: The [start, end) sample range the trace classifier compares. `None` for the whole trace.
+          - trace_crash_correlation (`float`) [default = `0.5`]: Traces correlating less than this with the reference are classified as crashed.
+          - trace_anomaly_z (`float`) [default = `4.0`]: Traces whose mean absolute z-distance from the reference is above this are classified as anomalous.
+          - store_interesting_traces (`bool`) [default = `False`]: Whether `run_sequence` should store the trace of tries that resulted in a success, a custom group, or that the trace classifier labelled anomalous, to `<run>_traces.npy` with a `<run>_traces_index.csv` index (setting, try number, result, label) in the run's results directory. Uses `trace_dtype`. Only tries outside of bursts (`burst_size` 1) are stored, the scope only holds the trace of the last attempt of a burst. Requires `should_block_and_check_for_reset`.
+          - tune_adc_window (`bool`) [default = `False`]: Whether the first `run_sequence` should calibrate `adc.offset`/`adc.samples` to the smallest window covering the target's activity and the glitch window, to shorten the capture readout of every try. Later runs keep the tuned window.
+          - trace_segment_bytes (`int`) [default = `64 * 1024 * 1024`]: The maximum size of a segment file when `capture_sequence` saves its traces (see `trace_store.SegmentedTraceWriter`).
+          - lazy_cwp_export (`bool`) [default = `True`]: Whether to skip creating the ChipWhisperer project after a capture, which stores every trace a second time. Create it later with `trace_store.export_cwp()` from the saved segments.
+          - store_normal_trace_fraction (`float`) [default = `0.0`]: With `store_interesting_traces`, the fraction of normal tries whose traces are stored too, as a baseline for `trace_analysis`.
+          - skip_unchanged_program (`bool`) [default = `False`]: Whether to skip programming when the target already holds `fw_image_path` and the configured config bytes, according to the record of what was flashed to each device (by UID/UCID) kept in `<results_dir>/program_cache.json` and a read back of the config bytes and a few sampled pages. Passes `program_cache` to the programmer (supported by `N76ICPProgrammer`) unless `programmer_args` already sets it.
         """
         self.max_iterations = max_iterations
         self.iter_before_report_status = iter_before_report_status
@@ -153,6 +210,29 @@ class TestOptions:
         self.fw_image_path = fw_image_path
         self.programmer_args = programmer_args if programmer_args else {}
         self.no_program = no_program
+        self.burst_size = burst_size
+        self.optimize_param_order = optimize_param_order
+        self.dry_run_sample = dry_run_sample
+        self.dry_run_confidence = dry_run_confidence
+        self.dry_run_margin = dry_run_margin
+        self.dry_run_max_reset_rate = dry_run_max_reset_rate
+        self.adaptive_breaks = adaptive_breaks
+        self.adaptive_break_window = adaptive_break_window
+        self.adaptive_break_reset_margin = adaptive_break_reset_margin
+        self.adaptive_break_latency_drift = adaptive_break_latency_drift
+        self.background_break_work = background_break_work
+        self.trace_dtype = trace_dtype
+        self.online_trace_stats = online_trace_stats
+        self.classify_traces = classify_traces
+        self.trace_roi = trace_roi
+        self.trace_crash_correlation = trace_crash_correlation
+        self.trace_anomaly_z = trace_anomaly_z
+        self.store_interesting_traces = store_interesting_traces
+        self.tune_adc_window = tune_adc_window
+        self.trace_segment_bytes = trace_segment_bytes
+        self.lazy_cwp_export = lazy_cwp_export
+        self.store_normal_trace_fraction = store_normal_trace_fraction
+        self.skip_unchanged_program = skip_unchanged_program
 
     def set_options(self, test_options):
         for key, value in test_options.__dict__.items():
@@ -187,6 +267,10 @@ class TestSetupTemplate(TestOptions):
         self._strmhandler.setLevel(self.logger_level)
         self._target_logger = logging.getLogger("ChipWhisperer Target")
         self.logger.addHandler(self._strmhandler)
+        # kept across runs: built by a dry run, used by the following runs
+        self._trace_reference: Optional[RunningTraceStats] = None
+        self._trace_classifier: Optional[TraceClassifier] = None
+        self._adc_window_tuned = False
         self._reset_run_vars()
     
     def to_json(self):
@@ -249,6 +333,8 @@ class TestSetupTemplate(TestOptions):
         setattr(self.scope.io, line, val)
 
     def reconnect(self):
+        # the scope may come back with different glitch settings, write them all again
+        self._first_iter = True
         try:
             if self.scope and self.target:
                 if self.scope_is_connected():
@@ -407,29 +493,50 @@ class TestSetupTemplate(TestOptions):
         max_repeat = c.most_common(1)[0][0]
         return {"width": max_width, "repeat": max_repeat}
 
-    def report_result(self, glitch_settings, result: Union[TestResult, str], reason="", silent=False, run_num=0):
+    def report_result(self, glitch_settings, result: Union[TestResult, str, List[Union[TestResult, str]]], reason="", silent=False, run_num=0):
+        """
+        Adds a result to the glitch controller.
+
+        `result` may also be a list of results (e.g. one per attempt of a burst); these are all accounted for at once.
+        """
+        if isinstance(result, list):
+            for res, count in Counter(result).items():
+                self._report_result(glitch_settings, res, reason, silent, run_num, count)
+        else:
+            self._report_result(glitch_settings, result, reason, silent, run_num, 1)
+
+    def _report_result(self, glitch_settings, result: Union[TestResult, str], reason, silent, run_num, count: int):
         # switch on result
         if not silent:
             if ((result != TestResult.skipped and result != TestResult.normal) or
-                (result == TestResult.skipped and self.logger_level <= TestOptions.LOG_TRACE) 
+                (result == TestResult.skipped and self.logger_level <= TestOptions.LOG_TRACE)
                 or (result == TestResult.normal and self.logger_level <= TestOptions.LOG_DEBUG)):
-                self.print_result(glitch_settings, result, reason, run_num=run_num)
+                self.print_result(glitch_settings, result, reason + (" (x%d)" % count if count > 1 else ""), run_num=run_num)
         if result == TestResult.normal:
-            self.gc.results.add("normal", glitch_settings)
-            self.gc.group_counts[self._normal_idx] += 1
+            group = "normal"
+            group_idx = self._normal_idx
         elif result == TestResult.reset:
-            self.gc.results.add("reset", glitch_settings)
-            self.gc.group_counts[self._reset_idx] += 1
+            group = "reset"
+            group_idx = self._reset_idx
         elif result == TestResult.success:
-            self.gc.results.add("success", glitch_settings)
-            self.gc.group_counts[self._success_idx] += 1
-            self._successful_settings.append(list(glitch_settings))
+            group = "success"
+            group_idx = self._success_idx
+            self._successful_settings.extend([list(glitch_settings) for _ in range(count)])
         elif result == TestResult.skipped:
-            self.gc.results.add("skipped", glitch_settings)
-            self.gc.group_counts[self._skipped_idx] += 1
+            group = "skipped"
+            group_idx = self._skipped_idx
         else:
-            self.gc.results.add(result, glitch_settings)
-            self.gc.group_counts[self.gc.groups.index(result)] += 1
+            group = result
+            group_idx = self.gc.groups.index(result)
+        for _ in range(count):
+            self.gc.results.add(group, glitch_settings)
+        self.gc.group_counts[group_idx] += count
+
+    @staticmethod
+    def _has_reset(result: Union[TestResult, str, List[Union[TestResult, str]]]) -> bool:
+        if isinstance(result, list):
+            return TestResult.reset in result
+        return result == TestResult.reset
 
     def _check_bad_glitch_setting(self, glitch_setting) -> Optional[str]:
         width = glitch_setting[self._width_idx]
@@ -454,42 +561,173 @@ class TestSetupTemplate(TestOptions):
             self.scope.glitch.ext_offset = glitch_setting[self._ext_offset_idx]
             self._first_iter = False
         else:
-            if not self._width_is_static:
+            # only write what changed; width/offset writes are slow on the CW-Lite
+            last = self._last_glitch_setting
+            if not self._width_is_static and glitch_setting[self._width_idx] != last[self._width_idx]:
                 self.scope.glitch.width = glitch_setting[self._width_idx]
-            if not self._offset_is_static:
+            if not self._offset_is_static and glitch_setting[self._offset_idx] != last[self._offset_idx]:
                 self.scope.glitch.offset = glitch_setting[self._offset_idx]
-            if not self._repeat_is_static:
+            if not self._repeat_is_static and glitch_setting[self._repeat_idx] != last[self._repeat_idx]:
                 self.scope.glitch.repeat = glitch_setting[self._repeat_idx]
-            if not self._ext_offset_is_static:
+            if not self._ext_offset_is_static and glitch_setting[self._ext_offset_idx] != last[self._ext_offset_idx]:
                 self.scope.glitch.ext_offset = glitch_setting[self._ext_offset_idx]
+        self._last_glitch_setting = glitch_setting
         return True
     
     def _take_a_break(self, seconds):
+        if self.adaptive_breaks:
+            self.logger.info("*** taking a break for %.1f seconds (%s)..." % (seconds, self._break_scheduler.degraded_reason()))
+            self._total_break_seconds += self._break_scheduler.take_break(seconds, lambda: bool(self.scope.clock.adc_locked), self._break_sleep)
+            return True
         self.logger.info("*** taking a break for %d seconds..." % (seconds))
-        time.sleep(seconds)
+        self._break_sleep(seconds)
+        self._total_break_seconds += seconds
         return True
 
+    def _break_sleep(self, seconds):
+        if self._break_executor:
+            if not self._break_executor.wait(seconds):
+                self.logger.debug("Background work did not finish during the break, continuing asynchronously")
+        else:
+            time.sleep(seconds)
+
+    def _queue_break_work(self):
+        if not self.no_save:
+            snapshot = self._snapshot_glitch_session(self._run_name)
+            self._break_executor.submit("save", self._write_glitch_session, snapshot)
+            self._break_executor.submit("summary", self._write_session_summary, snapshot)
+        if self._settings_prefetcher:
+            self._break_executor.submit("prefetch", self._settings_prefetcher.prefetch)
+
+    def _open_interesting_trace_store(self, name) -> Optional[IndexedTraceStore]:
+        date = datetime.fromtimestamp(self._start_time).strftime(DATE_FORMAT) if self._start_time else datetime.now().strftime(DATE_FORMAT)
+        run_res_dir = os.path.abspath(os.path.join(self.results_dir, name + "_" + date))
+        if not self.make_dir_and_check_writable(run_res_dir):
+            self.logger.error("ERROR: Cannot write traces to directory %s" % run_res_dir)
+            return None
+        metadata = {
+            "name": name,
+            "date": date,
+            "adc_samples": self.scope.adc.samples,
+            "adc_offset": self.scope.adc.offset,
+            "adc_freq": self.scope.clock.adc_freq,
+        }
+        return IndexedTraceStore(os.path.join(run_res_dir, name + "_" + date + "_traces.npy"), list(self.glitch_params.param_order), self.trace_dtype, metadata)
+
+    def _get_last_trace_to_store(self):
+        return self.scope.get_last_trace(as_int=True) if self.trace_dtype == "int16" else self.scope.get_last_trace()
+
+    def _store_trace_if_interesting(self, glitch_setting, result, try_num: int, trace_label: Optional[TraceLabel], trace = None):
+        """
+        Stores the trace of a single (non-burst) try. `trace` is the one already read with `_get_last_trace_to_store()`, if any.
+        """
+        interesting = result == TestResult.success or not isinstance(result, TestResult)
+        if not interesting and trace_label != TraceLabel.anomalous:
+            # a random sample of normal traces to compare against
+            if self.store_normal_trace_fraction <= 0 or random.random() >= self.store_normal_trace_fraction:
+                return
+        if trace is None:
+            # the last capture is still in the scope's buffer
+            trace = self._get_last_trace_to_store()
+        self._interesting_traces.append(trace, glitch_setting, try_num, str(result), str(trace_label) if trace_label else "")
+
+    def _tune_adc_window(self, total_iters: int):
+        self.logger.info("*** Tuning ADC window...")
+        result = tune_adc_window(self)
+        self._adc_window_tuned = True
+        if result["samples"] == result["old_samples"]:
+            self.logger.info("*** ADC window not changed, no smaller window covers the target's activity")
+            return
+        self.logger.info("*** ADC window: offset %d -> %d, samples %d -> %d" % (result["old_offset"], result["offset"], result["old_samples"], result["samples"]))
+        self.logger.info("*** Capture readout: %.2fms -> %.2fms per try (est. %.1fs saved this run)" % (
+            result["old_readout_seconds"] * 1000, result["readout_seconds"] * 1000, result["seconds_saved_per_try"] * total_iters))
+
+    def set_trace_reference(self, stats: RunningTraceStats):
+        """
+        Sets the reference profile of normal traces for `classify_traces` (e.g. the "normal" group of `capture_sequence` stats).
+        """
+        self._trace_reference = stats
+        self._trace_classifier = TraceClassifier.from_stats(stats, self.trace_roi, self.trace_crash_correlation, self.trace_anomaly_z)
+
+    def _record_try(self, outcome: str, seconds: float, count: int):
+        self._eta.add(outcome, seconds, count)
+        if self.adaptive_breaks and outcome != "skipped":
+            self._break_scheduler.record(outcome == "reset", seconds / count, count)
+            if self._crossed_interval(self._break_scheduler.clock_check_interval):
+                self._break_scheduler.record_clock(bool(self.scope.clock.adc_locked))
+
     def report_status(self, glitch_settings=None):
         self._report_status(glitch_settings, self._current_run_tries,
                             self.glitch_params.get_number_of_iters() * self.tries_per_setting)
 
-    def _report_status(self, glitch_settings, num_tries: int, total_tries: int):
+    def _count_unskipped_settings(self, allowed: dict[str, list]) -> int:
+        """
+        Returns the number of settings in the product of the `allowed` param values that the current skip rules won't skip.
+        """
+        def ok(value):
+            return self.use_0_width_offset or not (-1 < value < 1)
+        bad_width_thresholds = {round(width, 6): thresh for width, thresh in self._width_repeat_thresholds.items()}
+        count = 0
+        for width in allowed["width"]:
+            if not ok(width):
+                continue
+            thresh = bad_width_thresholds.get(round(width, 6))
+            if thresh is None:
+                count += len(allowed["repeat"])
+            else:
+                count += sum(1 for repeat in allowed["repeat"] if repeat < thresh)
+        return count * sum(1 for offset in allowed["offset"] if ok(offset)) * len(allowed["ext_offset"])
+
+    def _count_remaining_settings(self, glitch_setting) -> Optional[tuple[int, int]]:
+        """
+        Returns the (unskipped, total) number of settings from `glitch_setting` (inclusive) to the end of the grid, or None if it can't be computed.
+        """
+        if self._sampled_dry_run or not self._grid_is_product:
+            return None
+        order = self.glitch_params.param_order
+        digits = [min(range(len(param_values)), key=lambda j: abs(param_values[j] - glitch_setting[k]))
+                  for k, param_values in enumerate(self._param_values)]
+        unskipped = 0
+        total = 0
+        # settings after the current one: the first k digits are the same and digit k is larger (or equal for the last digit)
+        for k in range(len(order)):
+            allowed = {}
+            for j, param_values in enumerate(self._param_values):
+                if j < k:
+                    allowed[order[j]] = [param_values[digits[j]]]
+                elif j == k:
+                    allowed[order[j]] = param_values[digits[j] + (0 if k == len(order) - 1 else 1):]
+                else:
+                    allowed[order[j]] = param_values
+            total += math.prod(len(vals) for vals in allowed.values())
+            unskipped += self._count_unskipped_settings(allowed)
+        return unskipped, total
+
+    def _break_seconds_between(self, start_tries: int, end_tries: int) -> float:
+        if self.adaptive_breaks:
+            return self._break_scheduler.break_seconds_per_try() * (end_tries - start_tries)
+        very_big_breaks = end_tries // self.iter_before_very_big_break - start_tries // self.iter_before_very_big_break
+        big_breaks = end_tries // self.iter_before_big_break - start_tries // self.iter_before_big_break - very_big_breaks
+        small_breaks = end_tries // self.iter_before_small_break - start_tries // self.iter_before_small_break - big_breaks - very_big_breaks
+        return (self.very_big_break_seconds * very_big_breaks) + (self.big_break_seconds * big_breaks) + (self.small_break_seconds * small_breaks)
+
+    def _report_status(self, glitch_settings, num_tries: int, total_tries: int, tries_done_on_setting: int = 0):
         time_elapsed = time.time() - self._start_time
         time_m_s_str = "%dm%02ds" % divmod(time_elapsed, 60)
-        if num_tries > 0 and time_elapsed > 10:
-            remaining_tries = total_tries - num_tries
-            very_big_breaks_taken = num_tries // self.iter_before_very_big_break
-            big_breaks_taken = num_tries // self.iter_before_big_break - very_big_breaks_taken
-            small_breaks_taken = num_tries // self.iter_before_small_break - big_breaks_taken - very_big_breaks_taken
-            time_on_tries = time_elapsed - (self.very_big_break_seconds * very_big_breaks_taken) - (self.big_break_seconds * big_breaks_taken) - (self.small_break_seconds * small_breaks_taken)
-            very_big_breaks_remaining = remaining_tries // self.iter_before_very_big_break  
-            big_breaks_remaining = remaining_tries // self.iter_before_big_break - very_big_breaks_remaining
-            small_breaks_remaining = remaining_tries // self.iter_before_small_break - big_breaks_remaining - very_big_breaks_remaining
-            break_second = (self.very_big_break_seconds * very_big_breaks_remaining) + (self.big_break_seconds * big_breaks_remaining) + (self.small_break_seconds * small_breaks_remaining)
-            estimated_time_remaining = (time_on_tries / num_tries) * (remaining_tries) + break_second
+        remaining = self._count_remaining_settings(glitch_settings)
+        if remaining is not None:
+            remaining_attempts = max(0, remaining[0] * self.tries_per_setting - tries_done_on_setting)
+            remaining_skipped = (remaining[1] - remaining[0]) * self.tries_per_setting
+        else:
+            remaining_attempts = max(0, total_tries - num_tries)
+            remaining_skipped = 0
+        break_seconds = self._break_seconds_between(self._current_run_tries, self._current_run_tries + remaining_attempts)
+        estimated_time_remaining = self._eta.estimate(remaining_attempts, remaining_skipped, break_seconds)
+        if estimated_time_remaining is not None:
             est_m_s_str = "%dm%02ds" % divmod(estimated_time_remaining, 60)
-            self.logger.info("* STATUS [%d / %d] (%s / ETR: %s): %s" % (num_tries, total_tries,
-                time_m_s_str, est_m_s_str, self.get_current_counts()))
+            finish_str = datetime.fromtimestamp(time.time() + estimated_time_remaining).strftime("%H:%M:%S")
+            self.logger.info("* STATUS [%d / %d] (%s / ETR: %s, done at %s, %d tries left): %s" % (num_tries, total_tries,
+                time_m_s_str, est_m_s_str, finish_str, remaining_attempts, self.get_current_counts()))
         else:
             self.logger.info("* STATUS [%d / %d] (%s, Est. unknown): %s" % (num_tries, total_tries, time_m_s_str, self.get_current_counts()))
         self.logger.info(" - Next params: %s\n" %
@@ -510,14 +748,20 @@ class TestSetupTemplate(TestOptions):
                 cnt_str += ", "
         return cnt_str
 
-    def should_take_break(self) -> int:
+    def _crossed_interval(self, interval: int) -> bool:
+        # tries can advance by more than one at a time (bursts), so check if we crossed a multiple of interval
+        return self._current_run_tries // interval > self._prev_run_tries // interval
+
+    def should_take_break(self) -> float:
         if self._current_run_tries == 0:
             return 0
-        if self._current_run_tries % self.iter_before_very_big_break == 0:
+        if self.adaptive_breaks:
+            return self._break_scheduler.break_seconds()
+        if self._crossed_interval(self.iter_before_very_big_break):
             return self.very_big_break_seconds
-        if self._current_run_tries % self.iter_before_big_break == 0:
+        if self._crossed_interval(self.iter_before_big_break):
             return self.big_break_seconds
-        elif self._current_run_tries % self.iter_before_small_break == 0:
+        elif self._crossed_interval(self.iter_before_small_break):
             return self.small_break_seconds
         return 0
     # User defined functions
@@ -553,6 +797,8 @@ class TestSetupTemplate(TestOptions):
     def iter_run(self) -> bool:
         """
         Run the test; whatever this does, it should end up triggering a trigger line set in `scope.trigger.triggers`
+
+        In burst mode (`burst_size` > 1), this should perform `self._current_burst_size` attempts with a single command.
         """
         self._set_io_line("tio4", True)
         time.sleep(0.0001)
@@ -565,10 +811,12 @@ class TestSetupTemplate(TestOptions):
         This retrieves the data from the target
         
         This will be passed into check_result below
+
+        In burst mode, this may return the per-attempt results of the whole burst.
         """
         return "Normal"
 
-    def check_result(self, data: Any) -> Union[TestResult, str]:
+    def check_result(self, data: Any) -> Union[TestResult, str, List[Union[TestResult, str]]]:
         """
         This is where you check the result of the test
         - Return `TestResult.normal` if the data is what we would expect from an unglitched run
@@ -576,12 +824,131 @@ class TestSetupTemplate(TestOptions):
         - Return `TestResult.success` if the data indicates a successful glitch
         - Return a string if you want to add this result to a custom group (e.g. `"interesting"`)
           - Make sure to add these to your `GlitchControllerParams`
+        - In burst mode, return a list with one of the above per attempt, in order.
+          - Attempts after a `TestResult.reset` in the list are ignored; return `[TestResult.reset]` if it is unknown which attempt reset.
         """
         return TestResult.normal
 
-    def inc_run_tries(self):
-        self._current_run_tries += 1
-        self._total_run_tries += 1
+    def inc_run_tries(self, count: int = 1):
+        self._prev_run_tries = self._current_run_tries
+        self._current_run_tries += count
+        self._total_run_tries += count
+
+    def _uncount_run_tries(self, count: int):
+        """
+        Takes back `count` tries counted by `inc_run_tries` that never got a result (e.g. the rest of a burst after a reset).
+        """
+        self._current_run_tries -= count
+        self._total_run_tries -= count
+        self._prev_run_tries = min(self._prev_run_tries, self._current_run_tries)
+
+    def apply_optimal_param_order(self):
+        """
+        Measures the write cost of each glitch parameter and reorders `glitch_params.param_order` to minimize the total reconfiguration time.
+        """
+        costs = measure_param_write_costs(self.scope, self.glitch_params)
+        current_order = list(self.glitch_params.param_order)
+        current_time = estimate_reconfig_seconds(self.glitch_params, current_order, costs)
+        best_order, best_time = find_optimal_param_order(self.glitch_params, costs)
+        self.logger.info("*** Glitch parameter write costs: " + ", ".join("%s = %.2fms" % (param, costs[param] * 1000) for param in current_order))
+        if best_order == current_order:
+            self.logger.info("*** Param order %s is already optimal (est. %.1fs of reconfiguration)" % (str(current_order), current_time))
+            return
+        if sum(self.gc.group_counts) > 0:
+            self.logger.warn("*** Not reordering params, glitch controller already has results (est. %.1fs could be saved with %s)" % (current_time - best_time, str(best_order)))
+            return
+        self.logger.info("*** Reordering params %s -> %s: est. %.1fs -> %.1fs of reconfiguration (saves %.1fs)" % (str(current_order), str(best_order), current_time, best_time, current_time - best_time))
+        self.glitch_params.param_order = best_order
+        self.gc = self.glitch_params.generate_glitch_controller()
+        self._update_param_indexes()
+
+    def _sample_dry_run_settings(self) -> list[list]:
+        """
+        Returns a random sample of the glitch settings that won't be skipped (in grid order), large enough for the reset
+        rate's upper bound to fall below `dry_run_max_reset_rate` if the reset rate is `dry_run_margin` below it.
+        The first and last unskipped values of every parameter are always included, unless earlier runs found them bad.
+        """
+        def ok(param, value):
+            return param not in ("width", "offset") or self.use_0_width_offset or not (-1 < value < 1)
+        values = [[value for value in self.glitch_params.get_param_values(param) if ok(param, value)] for param in self.glitch_params.param_order]
+        radices = [len(param_values) for param_values in values]
+        grid_size = math.prod(radices)
+        if grid_size == 0:
+            return []
+        if self.dry_run_max_reset_rate <= 0 or self.dry_run_margin <= 0:
+            raise ValueError("dry_run_max_reset_rate and dry_run_margin must be above 0 to size a sampled dry run")
+        sample_tries = required_sample_size_for_bound(self.dry_run_confidence, self.dry_run_max_reset_rate,
+                                                      max(0.0, self.dry_run_max_reset_rate - self.dry_run_margin), grid_size * self.tries_per_setting)
+        num_settings = min(grid_size, math.ceil(sample_tries / self.burst_size))
+
+        def to_grid_index(digits):
+            idx = 0
+            for digit, radix in zip(digits, radices):
+                idx = idx * radix + digit
+            return idx
+
+        def to_setting(idx):
+            setting = []
+            for param_values, radix in zip(reversed(values), reversed(radices)):
+                idx, digit = divmod(idx, radix)
+                setting.insert(0, param_values[digit])
+            return setting
+
+        idxs = set()
+        drawn = set()
+        def draw(idx):
+            if idx in drawn:
+                return
+            drawn.add(idx)
+            # bad width/repeat combinations found by earlier runs are skipped too, so they don't count towards the sample
+            if self._check_bad_glitch_setting(to_setting(idx)) is None:
+                idxs.add(idx)
+
+        for param_idx, radix in enumerate(radices):
+            if radix < 2:
+                continue
+            for value_idx in (0, radix - 1):
+                digits = [random.randrange(r) for r in radices]
+                digits[param_idx] = value_idx
+                draw(to_grid_index(digits))
+        # keep drawing until the sample is large enough or the grid runs out
+        while len(idxs) < num_settings and len(drawn) < grid_size:
+            if 2 * len(drawn) < grid_size:
+                draw(random.randrange(grid_size))
+                continue
+            # most of the grid is drawn already, go through the rest in random order
+            rest = [idx for idx in range(grid_size) if idx not in drawn]
+            random.shuffle(rest)
+            for idx in rest:
+                draw(idx)
+                if len(idxs) >= num_settings:
+                    break
+        return [to_setting(idx) for idx in sorted(idxs)]
+
+    def _run_group_counts(self) -> list[int]:
+        """
+        Returns the result group counts of the current run, without the ones of earlier runs.
+        """
+        return [count - start for count, start in zip(self.gc.group_counts, self._run_start_group_counts)]
+
+    def print_dry_run_verdict(self):
+        group_counts = self._run_group_counts()
+        attempts = sum(group_counts) - group_counts[self._skipped_idx]
+        resets = group_counts[self._reset_idx]
+        successes = group_counts[self._success_idx]
+        low, high = wilson_interval(resets, attempts, self.dry_run_confidence, one_sided=True)
+        if high <= self.dry_run_max_reset_rate:
+            verdict = "STABLE"
+        elif low > self.dry_run_max_reset_rate:
+            verdict = "UNSTABLE"
+        else:
+            verdict = "INCONCLUSIVE"
+        self.logger.info("******** Dry run verdict: %s" % verdict)
+        self.logger.info(" - Reset rate: %d / %d = %.2f%% (%d%% one-sided bounds: %.2f%% - %.2f%%, max allowed %.2f%%)" % (
+            resets, attempts, 100 * resets / attempts if attempts else 0, round(self.dry_run_confidence * 100), 100 * low, 100 * high, 100 * self.dry_run_max_reset_rate))
+        if successes > 0:
+            self.logger.warn(" - Got %d successes with glitching disabled, check_result() may be misclassifying results!" % successes)
+        self.logger.info("")
 
     def print_glitch_ranges(self):
         self.logger.info("*** Glitch ranges:")
@@ -596,6 +963,8 @@ class TestSetupTemplate(TestOptions):
                 single_values += ((" - %10s: %s\n" % (param,
                                   str(getattr(self.glitch_params, param + "_range")))))
         self.logger.info(" - tries per setting: %d" % self.tries_per_setting)
+        if self.burst_size > 1:
+            self.logger.info(" - attempts per burst: %d" % self.burst_size)
         self.logger.info(ranges + single_values)
 
     def print_final_results(self):
@@ -603,7 +972,8 @@ class TestSetupTemplate(TestOptions):
         if (self._total_run_tries != self._current_run_tries):
             self.logger.info(" - Total attempts of all runs: %d" % self._total_run_tries)
         self.logger.info(" - Number of run attempts: %d" % self._current_run_tries)
-        self.logger.info(" - Total time: %.1fs\n" % (time.time() - self._start_time))
+        self.logger.info(" - Total time: %.1fs" % (time.time() - self._start_time))
+        self.logger.info(" - Time spent in breaks: %.1fs\n" % self._total_break_seconds)
         # Error checking here because we cannot raise an exception...
         if not self.gc or not (self.gc.groups and len(self.gc.groups) == len(self.gc.group_counts)):
             self.logger.error("No glitch controller results found!")
@@ -668,6 +1038,36 @@ class TestSetupTemplate(TestOptions):
             self.logger.addHandler(filehndlr)
 
     def _reset_run_vars(self):
+        self._update_param_indexes()
+        
+        # Runtime state
+        self._current_run_tries = 0
+        self._prev_run_tries = 0
+        self._last_status_tries = 0
+        self._current_burst_size = 1
+        self._saved_trigger_src = None
+        self._start_time = time.time()
+        self._successful_settings = []
+        self._first_iter = True
+        self._last_glitch_setting = None
+        self._run_name = ""
+        self._dry_run = False
+        self._sampled_dry_run = False
+        self._run_start_group_counts = list(self.gc.group_counts)
+        self._eta = EtaEstimator()
+        self._break_scheduler = AdaptiveBreakScheduler(self.adaptive_break_window, self.adaptive_break_reset_margin, self.adaptive_break_latency_drift,
+                                                       self.small_break_seconds, self.very_big_break_seconds)
+        self._total_break_seconds = 0.0
+        self._break_executor: Optional[BreakExecutor] = None
+        self._settings_prefetcher: Optional[PrefetchingIterator] = None
+        self._building_trace_reference = False
+        self._trace_label_counts: Counter = Counter()
+        self._interesting_traces: Optional[IndexedTraceStore] = None
+
+        self._width_repeat_thresholds: dict[float, int] = {}
+        self._bad_widths: set[float] = set()
+
+    def _update_param_indexes(self):
         # Not really state, just for performance
         self._param_format_string: str = self.get_param_format_string(self.glitch_params.param_order)
         self._skipped_idx = self.gc.groups.index("skipped")
@@ -682,22 +1082,18 @@ class TestSetupTemplate(TestOptions):
         self._offset_is_static = self.glitch_params.is_static("offset")
         self._ext_offset_is_static = self.glitch_params.is_static("ext_offset")
         self._repeat_is_static = self.glitch_params.is_static("repeat")
-        
-        # Runtime state
-        self._current_run_tries = 0
-        self._start_time = time.time()
-        self._successful_settings = []
-        self._first_iter = True
-        self._run_name = ""
-        self._dry_run = False
-
-        self._width_repeat_thresholds: dict[float, int] = {}
-        self._bad_widths: set[float] = set()
+        self._param_values = [self.glitch_params.get_param_values(param) for param in self.glitch_params.param_order]
+        # multiple step sizes are swept one after another, so the grid isn't a simple product of the param values
+        self._grid_is_product = not any(isinstance(getattr(self.glitch_params, param + "_range"), list) and isinstance(getattr(self.glitch_params, param + "_range")[2], list)
+                                        for param in self.glitch_params.param_order)
 
     def program_target(self):
         if self.programmer_type and self.fw_image_path:
             self.logger.info("*** Programming target with %s...", self.fw_image_path)
-            cw.program_target(self.scope, self.programmer_type, self.fw_image_path, **self.programmer_args)
+            programmer_args = dict(self.programmer_args)
+            if self.skip_unchanged_program:
+                programmer_args.setdefault("program_cache", os.path.join(self.results_dir, "program_cache.json"))
+            cw.program_target(self.scope, self.programmer_type, self.fw_image_path, **programmer_args)
             self.reboot_flush()
         else:
             self.logger.warn("*** No programmer type or firmware image path set, skipping programming...")
@@ -722,10 +1118,35 @@ class TestSetupTemplate(TestOptions):
         return self.scope_is_connected() and hasattr(self.scope, "sc") and self.scope.sc.getStatus() & STATUS_ARM_MASK
 
     def _teardown_run(self):
+        if self._interesting_traces:
+            self.logger.info("*** Stored %d interesting traces to %s" % (self._interesting_traces.count, self._interesting_traces.path))
+            self._interesting_traces.close()
+            self._interesting_traces = None
+        if self._break_executor:
+            # let background saves finish so they can't overwrite the final one
+            self._break_executor.shutdown()
+            for job_name, error in self._break_executor.errors:
+                self.logger.error("Background '%s' job failed: %s" % (job_name, str(error)))
+            self._break_executor = None
+            self._settings_prefetcher = None
         self.glitch_disable()
+        if self._saved_trigger_src and self.scope_is_connected():
+            self.scope.glitch.trigger_src = self._saved_trigger_src
+            self._saved_trigger_src = None
         if self.scope_is_armed():
             self.scope.capture()
         self.print_final_results()
+        if self._sampled_dry_run:
+            self.print_dry_run_verdict()
+        if self._building_trace_reference:
+            self._building_trace_reference = False
+            if self._trace_reference and self._trace_reference.count >= 10:
+                self.set_trace_reference(self._trace_reference)
+                self.logger.info("*** Trace classifier reference built from %d normal traces" % self._trace_reference.count)
+            else:
+                self.logger.warn("*** Not enough normal traces in the dry run to build a trace classifier reference")
+        elif self._trace_label_counts:
+            self.logger.info(" - Trace labels: %s\n" % ", ".join("%s: %d" % (str(label), count) for label, count in self._trace_label_counts.items()))
         if self._strmhandler:
             self.logger.handlers = [self._strmhandler]
         else:
@@ -740,12 +1161,50 @@ class TestSetupTemplate(TestOptions):
         self._teardown_run()
         self._capture_mode = False
 
+    def _open_trace_store(self, name, samples) -> TraceMemmapWriter:
+        date = datetime.fromtimestamp(self._start_time).strftime(DATE_FORMAT) if self._start_time else datetime.now().strftime(DATE_FORMAT)
+        tracesdir = os.path.join(self.results_dir, "traces")
+        if self.no_save or not self.make_dir_and_check_writable(tracesdir):
+            tracesdir = self._trace_tempdir = tempfile.mkdtemp(prefix="traces_")
+        path = os.path.join(tracesdir, name + "_" + date + ".npy")
+        metadata = {
+            "name": name,
+            "date": date,
+            "adc_samples": self.scope.adc.samples,
+            "adc_offset": self.scope.adc.offset,
+            "adc_freq": self.scope.clock.adc_freq,
+        }
+        self.logger.info("*** Streaming traces to %s" % path)
+        return TraceMemmapWriter(path, samples, self.trace_dtype, metadata=metadata)
+
+    def _remove_trace_tempdir(self):
+        """
+        Removes the temporary directory the trace store fell back to. The returned memmap stays readable on POSIX systems,
+        where an open mapping keeps the deleted file's data around.
+        """
+        if self._trace_tempdir is None:
+            return
+        shutil.rmtree(self._trace_tempdir, ignore_errors=True)
+        if os.path.exists(self._trace_tempdir):
+            self.logger.warn("*** Could not remove temporary trace directory %s" % self._trace_tempdir)
+        self._trace_tempdir = None
+
+    def _save_streamed_traces(self, trace_store: Optional[TraceMemmapWriter], traces, name):
+        """
+        Saves the streamed traces as segments and deletes the streamed .npy, so the traces are only kept on disk once.
+        """
+        if self.write_capture_results_to_disk(traces, name) is not None and trace_store is not None:
+            trace_store.remove()
+
     def capture_sequence(self, total_attempts=1, capture_name = None):
         if capture_name is None:
             capture_name = self.name
         else:
             capture_name = capture_name
-        traces = []
+        trace_store: Optional[TraceMemmapWriter] = None
+        trace_stats: Optional[GroupedTraceStats] = GroupedTraceStats() if self.online_trace_stats else None
+        traces = None
+        self._trace_tempdir = None
         try:
             total_resets = 0
             self.setup_capture(capture_name)
@@ -769,8 +1228,11 @@ class TestSetupTemplate(TestOptions):
                     total_resets += 1
 
                 if num_tries % self.iter_before_report_status == 0:
+                    if trace_store:
+                        trace_store.flush()
                     self.logger.info("*** STATUS [%d / %d] (%.1fs): resets = %d" % (num_tries,
                           total_attempts, time.time() - self._start_time, total_resets))
+                try_start = time.time()
                 self.scope.arm()
                 # test
                 if not self.iter_run():
@@ -780,8 +1242,14 @@ class TestSetupTemplate(TestOptions):
                     total_resets += 1
                     self.logger.info("Detected reset during capture!!")
                     self.reboot_flush()
+                    self.inc_run_tries()
+                    self._record_try("reset", time.time() - try_start, 1)
                     continue
-                traces.append(self.scope.get_last_trace())
+                trace = self._get_last_trace_to_store()
+                if trace_stats is None:
+                    if trace_store is None:
+                        trace_store = self._open_trace_store(capture_name, len(trace))
+                    trace_store.append(trace)
                 if self.silence_target_warnings:
                     prev_level = self._target_logger.getEffectiveLevel()
                     self._target_logger.setLevel(logging.ERROR)
@@ -789,10 +1257,14 @@ class TestSetupTemplate(TestOptions):
                 result = self.check_result(data)
                 if self.silence_target_warnings:
                     self._target_logger.setLevel(prev_level)
+                if trace_stats is not None:
+                    trace_stats.add(str(result), traces_to_float(trace))
 
                 if result == TestResult.reset:
                     total_resets += 1
                     self.reboot_flush()
+                self.inc_run_tries()
+                self._record_try("reset" if result == TestResult.reset else "normal", time.time() - try_start, 1)
                 if total_resets > self.max_total_resets:
                     self.logger.info("*** STATUS [%d / %d] (%.1fs): resets = %d" % (num_tries,
                           total_attempts, time.time() - self._start_time, total_resets))
@@ -808,8 +1280,13 @@ class TestSetupTemplate(TestOptions):
         except Exception as e:
             self.logger.error("Exception occurred during capture run: %s", str(e))
             self._teardown_capture()
+            traces = trace_store.close() if trace_store else None
             if not self.no_save:
-                self.write_capture_results_to_disk(traces, capture_name)
+                if trace_stats is not None:
+                    self.write_trace_stats_to_disk(trace_stats, capture_name)
+                else:
+                    self._save_streamed_traces(trace_store, traces, capture_name)
+            self._remove_trace_tempdir()
             self.der_blinken_lights()
             self.after_run()
             # if it's not ours, raise
@@ -821,11 +1298,16 @@ class TestSetupTemplate(TestOptions):
 
             raise e
         self._teardown_capture()
+        traces = trace_store.close() if trace_store else None
         if not self.no_save:
-            self.write_capture_results_to_disk(traces, capture_name)
+            if trace_stats is not None:
+                self.write_trace_stats_to_disk(trace_stats, capture_name)
+            else:
+                self._save_streamed_traces(trace_store, traces, capture_name)
+        self._remove_trace_tempdir()
         # we don't call this above because it can raise an exception
         self.after_run()
-        return traces
+        return trace_stats if trace_stats is not None else traces
 
     def _check_if_dir_is_writable(self, dir):
         if not os.path.exists(dir):
@@ -872,9 +1354,30 @@ class TestSetupTemplate(TestOptions):
         return filepath
 
     def save_glitch_session(self, name = ""):
+        self._write_glitch_session(self._snapshot_glitch_session(name))
+
+    def _snapshot_glitch_session(self, name = "") -> dict[str, Any]:
+        """
+        Copies everything needed to save the session, so that it can be written while the run continues.
+        """
         if name == "":
             name = self.name
         date = datetime.fromtimestamp(self._start_time).strftime(DATE_FORMAT) if self._start_time else datetime.now().strftime(DATE_FORMAT)
+        results = None
+        if self.gc and self.gc.results and self.gc.results._result_dict:
+            results = {setting: dict(group_count_dict) for setting, group_count_dict in self.gc.results._result_dict.items()}
+        return {
+            "name": name,
+            "date": date,
+            "json": json.loads(json.dumps(self.to_json())),
+            "parameters": list(self.gc.parameters) if self.gc else [],
+            "groups": list(self.gc.groups) if self.gc else [],
+            "results": results
+        }
+
+    def _write_glitch_session(self, snapshot: dict[str, Any]):
+        name = snapshot["name"]
+        date = snapshot["date"]
         self.logger.info("Saving glitching session...")
         # can't raise exception here because we're in a teardown
         run_res_dir = os.path.abspath(os.path.join(self.results_dir, name + "_" + date))
@@ -886,18 +1389,19 @@ class TestSetupTemplate(TestOptions):
         csvfilepath_tmp = csvfilepath + ".tmp"
         jsonfilepath_tmp = jsonfilepath + ".tmp"
         with open(jsonfilepath_tmp, "w") as f:
-            f.write(json.dumps(self.to_json(), indent=4))
+            f.write(json.dumps(snapshot["json"], indent=4))
         if os.path.exists(jsonfilepath):
             os.remove(jsonfilepath)
         os.rename(jsonfilepath_tmp, jsonfilepath)
-        if not self.gc or not self.gc.results or not self.gc.results._result_dict:
+        if not snapshot["results"]:
             self.logger.error("ERROR: No glitch results to write")
             return
+        groups = snapshot["groups"]
         lines = []
-        header = ",".join(self.gc.parameters) + "," + ",".join(["%s,%s_rate" % (group, group) for group in self.gc.groups]) + ",total" + "\n"
+        header = ",".join(snapshot["parameters"]) + "," + ",".join(["%s,%s_rate" % (group, group) for group in groups]) + ",total" + "\n"
         lines.append(header)
-        for setting, group_count_dict in self.gc.results._result_dict.items():
-            group_str = ",".join([str(group_count_dict[group]) +"," +str(group_count_dict[group+"_rate"]) for group in self.gc.groups])
+        for setting, group_count_dict in snapshot["results"].items():
+            group_str = ",".join([str(group_count_dict[group]) +"," +str(group_count_dict[group+"_rate"]) for group in groups])
             string = ",".join([str(x) for x in setting]) + "," + group_str + "," + str(group_count_dict["total"])
             lines.append(string + "\n")
         with open(csvfilepath_tmp, "w") as f:
@@ -906,12 +1410,51 @@ class TestSetupTemplate(TestOptions):
             os.remove(csvfilepath)
         os.rename(csvfilepath_tmp, csvfilepath)
         self.logger.info("Glitching session saved to %s" % run_res_dir)
-        
 
-    def write_capture_results_to_disk(self, traces, name = ""):
-        if not traces:
-            self.logger.error("ERROR: No traces to write")
+    def _write_session_summary(self, snapshot: dict[str, Any], top_n = 20):
+        """
+        Writes per-group totals, per-parameter-value counts and the settings with the highest success rates to <run>_summary.json.
+        """
+        if not snapshot["results"]:
+            return
+        name = snapshot["name"]
+        date = snapshot["date"]
+        groups = snapshot["groups"]
+        parameters = snapshot["parameters"]
+        run_res_dir = os.path.abspath(os.path.join(self.results_dir, name + "_" + date))
+        if not self.make_dir_and_check_writable(run_res_dir):
             return
+        totals = {group: 0 for group in groups + ["total"]}
+        per_param: dict[str, dict[str, dict[str, int]]] = {param: {} for param in parameters}
+        for setting, group_count_dict in snapshot["results"].items():
+            for group in totals:
+                totals[group] += group_count_dict[group]
+            for i, param in enumerate(parameters):
+                value_counts = per_param[param].setdefault(str(setting[i]), {group: 0 for group in totals})
+                for group in totals:
+                    value_counts[group] += group_count_dict[group]
+        best = sorted(snapshot["results"].items(), key=lambda item: item[1]["success_rate"] if "success_rate" in item[1] else 0, reverse=True)[:top_n]
+        summary = {
+            "totals": totals,
+            "settings": len(snapshot["results"]),
+            "per_param": per_param,
+            "top_success_settings": [{"setting": list(setting), **group_count_dict} for setting, group_count_dict in best if group_count_dict.get("success", 0) > 0]
+        }
+        summaryfilepath = self._make_results_file_name(name, date + "_summary", run_res_dir, ".json", overwrite = True)
+        with open(summaryfilepath + ".tmp", "w") as f:
+            f.write(json.dumps(summary, indent=4))
+        if os.path.exists(summaryfilepath):
+            os.remove(summaryfilepath)
+        os.rename(summaryfilepath + ".tmp", summaryfilepath)
+
+    def write_capture_results_to_disk(self, traces, name = "") -> Optional[str]:
+        """
+        Saves the traces as segments (see `trace_store.SegmentedTraceWriter`) and, unless `lazy_cwp_export` is set, as a
+        ChipWhisperer project. Returns the path of the segments index, or None if nothing was written.
+        """
+        if traces is None or len(traces) == 0:
+            self.logger.error("ERROR: No traces to write")
+            return None
         if name == "":
             name = self.name
         date = datetime.fromtimestamp(self._start_time).strftime(DATE_FORMAT) if self._start_time else datetime.now().strftime(DATE_FORMAT)
@@ -920,16 +1463,33 @@ class TestSetupTemplate(TestOptions):
         # can't raise exception here because we're in a teardown
         if not self.make_dir_and_check_writable(tracesdir):
             self.logger.error("ERROR: Cannot write glitch results to directory %s" % tracesdir)
-            return
+            return None
         project_path = os.path.join(tracesdir, basename)
-        _project = cw.create_project(project_path)
-        for i in range(0, len(traces)):
-            trace = traces[i]
-            _project.traces.append(cw.Trace(trace, "", "", i))
-        _project.save()
-        _project.close()
-        _project = None
-        self.logger.info("Traces saved to %s" % project_path + ".cwp")
+        metadata = {"name": name, "date": date}
+        # one segment at a time, `traces` may be a memmap bigger than RAM
+        index_path = write_segmented_traces(traces, project_path + "_segments", self.trace_segment_bytes, metadata)
+        self.logger.info("Traces saved to %s" % index_path)
+        if self.lazy_cwp_export:
+            self.logger.info("Not creating ChipWhisperer project, use trace_store.export_cwp('%s', '%s')" % (index_path, project_path))
+            return index_path
+        self.logger.info("Traces saved to %s" % export_cwp(index_path, project_path))
+        return index_path
+
+    def write_trace_stats_to_disk(self, trace_stats: GroupedTraceStats, name = ""):
+        if not trace_stats.groups:
+            self.logger.error("ERROR: No trace stats to write")
+            return
+        if name == "":
+            name = self.name
+        date = datetime.fromtimestamp(self._start_time).strftime(DATE_FORMAT) if self._start_time else datetime.now().strftime(DATE_FORMAT)
+        tracesdir = os.path.join(self.results_dir, "traces")
+        # can't raise exception here because we're in a teardown
+        if not self.make_dir_and_check_writable(tracesdir):
+            self.logger.error("ERROR: Cannot write trace stats to directory %s" % tracesdir)
+            return
+        stats_path = os.path.join(tracesdir, name + "_" + date + "_stats.npz")
+        trace_stats.save(stats_path)
+        self.logger.info("Trace stats (%s) saved to %s" % (", ".join("%s: %d" % (group, stats.count) for group, stats in trace_stats.groups.items()), stats_path))
 
     def run_sequence(self, name = "", dry_run = False):
         last_setting = None
@@ -954,22 +1514,63 @@ class TestSetupTemplate(TestOptions):
         try:
             self.setup_run(run_name)
             self._dry_run = dry_run
+            if self.background_break_work:
+                self._break_executor = BreakExecutor()
+            if self.classify_traces:
+                if not self.should_block_and_check_for_reset:
+                    self.logger.warn("*** classify_traces requires should_block_and_check_for_reset, not classifying traces")
+                elif dry_run:
+                    self._building_trace_reference = True
+                    self._trace_reference = None
+                elif not self._trace_classifier:
+                    self.logger.warn("*** No trace classifier reference, do a dry run first or call set_trace_reference()")
+            if self.store_interesting_traces and not dry_run:
+                if self.no_save or not self.should_block_and_check_for_reset:
+                    self.logger.warn("*** store_interesting_traces requires should_block_and_check_for_reset and saving, not storing traces")
+                else:
+                    self._interesting_traces = self._open_interesting_trace_store(run_name)
+            if self.optimize_param_order:
+                self.apply_optimal_param_order()
             if not dry_run:
                 self.glitch_enable()
             else:
                 self.glitch_disable()
+            if self.burst_size > 1 and self.scope.glitch.trigger_src == "ext_single":
+                # ext_single only glitches the first trigger after arming; every attempt in a burst needs a glitch
+                self.logger.info("*** Burst mode: switching glitch.trigger_src to 'ext_continuous'")
+                self._saved_trigger_src = self.scope.glitch.trigger_src
+                self.scope.glitch.trigger_src = "ext_continuous"
             self._reacquire_clock()
             self.logger.info(f"******** Test run configuration '{run_name}'" + (" (DRY RUN)" if dry_run else "") + ":")
             self.logger.info("")
             self.print_relevant_scope_glitch_status()
             self.logger.info("")
             self.print_glitch_ranges()
+            tries_per_setting = self.tries_per_setting
             total_iters = self.glitch_params.get_number_of_iters(False) * self.tries_per_setting
+            glitch_settings = self.gc.glitch_values()
+            if dry_run and self.dry_run_sample:
+                self._sampled_dry_run = True
+                glitch_settings = self._sample_dry_run_settings()
+                tries_per_setting = self.burst_size
+                self.logger.info("*** Sampled dry run: %d settings x %d tries (%.1f%% of %d iterations)" % (
+                    len(glitch_settings), tries_per_setting, 100 * len(glitch_settings) * tries_per_setting / total_iters if total_iters else 0, total_iters))
+                total_iters = len(glitch_settings) * tries_per_setting
+            elif self._break_executor:
+                glitch_settings = self._settings_prefetcher = PrefetchingIterator(glitch_settings)
             self.logger.info("*** Total number of iterations: %d\n" % (total_iters))
             self.logger.info("******** Prepping run...")
             self.reboot_flush()
             self.prep_run()
+            if self.tune_adc_window and not self._adc_window_tuned:
+                self.glitch_disable()
+                self._tune_adc_window(total_iters)
+                self.reboot_flush()
+                if not dry_run:
+                    self.glitch_enable()
             self._reacquire_clock()
+            # the param order optimization may have replaced the glitch controller
+            self._run_start_group_counts = list(self.gc.group_counts)
             self.logger.info("******** Starting test run...{}".format(" (DRY RUN)" if dry_run else ""))
             def handle_reset(setting, reason):
                 if setting:
@@ -987,7 +1588,7 @@ class TestSetupTemplate(TestOptions):
                     raise Exception("Error in iter_run()")
                 data = self.get_data()
                 result = self.check_result(data)
-                if result == TestResult.reset:
+                if self._has_reset(result):
                     self.logger.warn("***** Target is unresponsive, attempting reconnect...")
                     self.reconnect()
                     time.sleep(1)
@@ -997,7 +1598,7 @@ class TestSetupTemplate(TestOptions):
                         raise Exception("Error in iter_run()")
                     data = self.get_data()
                     result = self.check_result(data)
-                    if result == TestResult.reset:
+                    if self._has_reset(result):
                         self.logger.error("***** Target is still unresponsive, exiting...")
                         raise DeviceUnresponsiveException("Target is unresponsive")
                     # don't clear resets
@@ -1013,7 +1614,21 @@ class TestSetupTemplate(TestOptions):
                             reset_settings.clear()
                             consecutive_resets = 0
                             consecutive_timeouts = 0
-            for glitch_setting in self.gc.glitch_values():                
+            def finish_try(setting, group, try_start, attempts): # bookkeeping after every try that ran, whatever its result
+                self._record_try(group, time.time() - try_start, attempts)
+                if self.max_total_resets > 0 and total_resets > self.max_total_resets:
+                    self._report_status(setting, self._current_run_tries + total_skipped, total_iters)
+                    self.logger.info("***** Too many resets, exiting...")
+                    raise TooManyResetsException("Too many resets")
+                if self.should_take_break() > 0:
+                    if self._break_executor:
+                        self._queue_break_work()
+                    elif self.should_take_break() >= self.big_break_seconds and not self.no_save:
+                        self.save_glitch_session(self._run_name)
+                    if not self._take_a_break(self.should_take_break()):
+                        # Too many resets
+                        raise TooManyResetsException("Too many resets")
+            for glitch_setting in glitch_settings:
                 width = glitch_setting[self._width_idx]
                 offset = glitch_setting[self._offset_idx]
                 # TODO: FIX THIS HACK
@@ -1023,7 +1638,9 @@ class TestSetupTemplate(TestOptions):
                     last_width = width
                     reset_settings.clear()
 
-                for i in range(0, self.tries_per_setting):
+                for i in range(0, tries_per_setting, self.burst_size):
+                    self._current_burst_size = min(self.burst_size, tries_per_setting - i)
+                    try_start = time.time()
                     last_state = self.scope.adc.state
                     if self.long_trigger_high_is_reset and last_state:
                         # can detect crash here (fast) before timing out (slow)
@@ -1037,18 +1654,20 @@ class TestSetupTemplate(TestOptions):
                         if reported_bad_skip != _bad_setting:
                             self.logger.info("* Skipping bad setting: {0}".format(_bad_setting))
                             reported_bad_skip = _bad_setting
-                        self.report_result(glitch_setting, TestResult.skipped, "Bad setting", run_num=self._current_run_tries + total_skipped)
-                        total_skipped += 1
+                        self.report_result(glitch_setting, [TestResult.skipped] * self._current_burst_size, "Bad setting", run_num=self._current_run_tries + total_skipped)
+                        total_skipped += self._current_burst_size
+                        self._record_try("skipped", time.time() - try_start, self._current_burst_size)
                         continue
                     if i == 0 and not self._set_glitch_settings(glitch_setting):
                         self.logger.warn("Setting glitch setting failed: %s" % str(glitch_setting))
                         continue
                     
                     last_setting = glitch_setting
-                    if self._current_run_tries % self.iter_before_report_status == 0:
+                    if self._current_run_tries == 0 or self._current_run_tries - self._last_status_tries >= self.iter_before_report_status:
+                        self._last_status_tries = self._current_run_tries
                         self._report_status(
-                            glitch_setting, self._current_run_tries + total_skipped, total_iters) 
-                    self.inc_run_tries()
+                            glitch_setting, self._current_run_tries + total_skipped, total_iters, i)
+                    self.inc_run_tries(self._current_burst_size)
                     self.scope.arm()
                     # test
                     if not self.iter_run():
@@ -1058,8 +1677,26 @@ class TestSetupTemplate(TestOptions):
                         consecutive_timeouts += 1
                         self._reacquire_clock()
                         handle_reset(glitch_setting, " Scope timed out")
+                        # the whole burst is reported as one reset
+                        self._uncount_run_tries(self._current_burst_size - 1)
+                        finish_try(glitch_setting, "reset", try_start, 1)
                         continue
                     consecutive_timeouts = 0
+                    trace = None
+                    stored_trace = None
+                    trace_label = None
+                    if self._current_burst_size == 1 and (self._building_trace_reference or (self._trace_classifier and self.classify_traces and not dry_run)):
+                        # read once, in the form the trace store keeps
+                        stored_trace = self._get_last_trace_to_store()
+                        trace = traces_to_float(stored_trace)
+                        if not self._building_trace_reference:
+                            trace_label = self._trace_classifier.classify(trace)
+                            self._trace_label_counts[trace_label] += 1
+                            if trace_label == TraceLabel.crashed:
+                                # no need to wait for the target to (not) answer
+                                handle_reset(glitch_setting, "Trace classified as crash")
+                                finish_try(glitch_setting, "reset", try_start, self._current_burst_size)
+                                continue
                     if self.silence_target_warnings:
                         prev_level = self._target_logger.getEffectiveLevel()
                         self._target_logger.setLevel(logging.ERROR)
@@ -1069,7 +1706,15 @@ class TestSetupTemplate(TestOptions):
                     result = self.check_result(data)
                     if self.silence_target_warnings:
                         self._target_logger.setLevel(prev_level)
-                    if result == TestResult.reset:
+                    results = result if isinstance(result, list) else [result]
+                    attempted = self._current_burst_size
+                    if TestResult.reset in results:
+                        # attempts of a burst before the reset still count, the ones after it never ran
+                        completed = results[:results.index(TestResult.reset)]
+                        attempted = min(len(completed) + 1, self._current_burst_size)
+                        self._uncount_run_tries(self._current_burst_size - attempted)
+                        if completed:
+                            self.report_result(glitch_setting, completed, run_num=self._current_run_tries + total_skipped)
                         handle_reset(glitch_setting, "")
                         if dry_run:
                             self.logger.info("Getting resets on dry run (%d/%d)!!" % (dry_run_resets, self.max_total_dry_run_resets))
@@ -1082,23 +1727,21 @@ class TestSetupTemplate(TestOptions):
                         consecutive_resets = 0
                         reset_settings.clear()
                         self.report_result(glitch_setting, result, run_num=self._current_run_tries + total_skipped)
-                        if result == TestResult.success:
+                        # the scope only holds the trace of the last attempt of a burst, so only single tries can be stored
+                        if self._interesting_traces and self._current_burst_size == 1:
+                            self._store_trace_if_interesting(glitch_setting, results[0], self._current_run_tries + total_skipped, trace_label, stored_trace)
+                        if self._building_trace_reference and trace is not None and results == [TestResult.normal] * len(results):
+                            if self._trace_reference is None:
+                                self._trace_reference = RunningTraceStats(len(trace))
+                            self._trace_reference.add(trace)
+                        if TestResult.success in results:
                             self.logger.debug("Success data: ")
                             self.logger.debug(str(data) if hasattr(data, "__str__") else data)
                             if self.should_break_on_success:
                                 self.logger.warn("SUCCESSFUL RESULT FOUND!! Breaking...")
                                 raise BreakOnSuccessException("SUCCESSFUL RESULT! Breaking...")
 
-                    if self.max_total_resets > 0 and total_resets > self.max_total_resets:
-                        self._report_status(glitch_setting, self._current_run_tries + total_skipped, total_iters)
-                        self.logger.info("***** Too many resets, exiting...")
-                        raise TooManyResetsException("Too many resets")
-                    if self.should_take_break() > 0:
-                        if self.should_take_break() >= self.big_break_seconds and not self.no_save:
-                            self.save_glitch_session(self._run_name)
-                        if not self._take_a_break(self.should_take_break()):
-                            # Too many resets
-                            raise TooManyResetsException("Too many resets")
+                    finish_try(glitch_setting, "reset" if TestResult.reset in results else "normal", try_start, attempted)
 
                     if not dry_run:
                         self.glitch_enable()
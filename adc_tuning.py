@@ -0,0 +1,95 @@
+import math
+import time
+from typing import Any, Optional
+import numpy as np
+
+DEFAULT_CALIBRATION_CAPTURES = 20
+DEFAULT_MARGIN = 0.1
+# activity = smoothed deviation from the trace's median above median + ACTIVITY_MADS * MAD
+ACTIVITY_MADS = 6
+
+
+def capture_calibration_traces(test, count: int = DEFAULT_CALIBRATION_CAPTURES) -> tuple[list[np.ndarray], float]:
+    """
+    Runs `count` tries of the test's target operation (glitching should be disabled) and returns the traces
+    and the average capture + readout time per try.
+    """
+    traces = []
+    readout_seconds = 0.0
+    for _ in range(count):
+        test.scope.arm()
+        if not test.iter_run():
+            raise Exception("Error in iter_run()")
+        start = time.perf_counter()
+        timed_out = test.scope.capture()
+        trace = test.scope.get_last_trace()
+        readout_seconds += time.perf_counter() - start
+        test.get_data()
+        if timed_out:
+            test.reboot_flush()
+            continue
+        traces.append(np.asarray(trace, dtype=np.float64))
+    return traces, readout_seconds / count if count else 0.0
+
+
+def find_activity_window(traces: list[np.ndarray], margin: float = DEFAULT_MARGIN) -> Optional[tuple[int, int]]:
+    """
+    Returns the [start, end) sample range where the mean trace deviates from its resting level, widened by `margin`
+    (a fraction of the window length on each side), or None if no activity stands out.
+    """
+    if not traces:
+        return None
+    mean = np.mean(traces, axis=0)
+    deviation = np.abs(mean - np.median(mean))
+    window = max(8, len(mean) // 500)
+    envelope = np.convolve(deviation, np.ones(window) / window, mode="same")
+    mad = np.median(np.abs(envelope - np.median(envelope)))
+    active = np.nonzero(envelope > np.median(envelope) + ACTIVITY_MADS * max(mad, 1e-9))[0]
+    if len(active) == 0:
+        return None
+    start, end = int(active[0]), int(active[-1]) + 1
+    pad = math.ceil((end - start) * margin) + window
+    return max(0, start - pad), min(len(mean), end + pad)
+
+
+def glitch_window_samples(test) -> tuple[int, int]:
+    """
+    Returns the [start, end) sample range (relative to the current adc.offset) that the glitches of the test's
+    ext_offset/repeat ranges can land in.
+    """
+    samples_per_cycle = test.scope.clock.adc_freq / test.scope.clock.clkgen_freq if test.scope.clock.clkgen_freq else 1
+    ext_offset = test.glitch_params.ext_offset_range
+    repeat = test.glitch_params.repeat_range
+    ext_min, ext_max = (ext_offset[0], ext_offset[1]) if isinstance(ext_offset, list) else (ext_offset, ext_offset)
+    repeat_max = repeat[1] if isinstance(repeat, list) else repeat
+    start = int(ext_min * samples_per_cycle) - test.scope.adc.offset
+    end = math.ceil((ext_max + repeat_max + 1) * samples_per_cycle) - test.scope.adc.offset
+    return max(0, start), max(0, end)
+
+
+def tune_adc_window(test, captures: int = DEFAULT_CALIBRATION_CAPTURES, margin: float = DEFAULT_MARGIN) -> dict[str, Any]:
+    """
+    Shrinks `adc.offset`/`adc.samples` to the smallest window covering the target's activity and the glitch window.
+
+    The target operation is captured with the current settings, the window is found, and readout time is measured again
+    with the new settings. The scope settings are left unchanged if no activity is found.
+    """
+    old_offset = test.scope.adc.offset
+    old_samples = test.scope.adc.samples
+    traces, old_readout = capture_calibration_traces(test, captures)
+    result = {"old_offset": old_offset, "old_samples": old_samples, "offset": old_offset, "samples": old_samples,
+              "old_readout_seconds": old_readout, "readout_seconds": old_readout, "seconds_saved_per_try": 0.0}
+    activity = find_activity_window(traces, margin)
+    if activity is None:
+        return result
+    glitch_start, glitch_end = glitch_window_samples(test)
+    start = min(activity[0], glitch_start)
+    end = max(activity[1], min(glitch_end, old_samples))
+    if end - start >= old_samples:
+        return result
+    test.scope.adc.offset = old_offset + start
+    test.scope.adc.samples = end - start
+    _, new_readout = capture_calibration_traces(test, max(1, captures // 4))
+    result.update({"offset": test.scope.adc.offset, "samples": test.scope.adc.samples, "readout_seconds": new_readout,
+                   "seconds_saved_per_try": old_readout - new_readout})
+    return result
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+
+class BreakExecutor:
+    """
+    Runs queued work (saving results, refreshing summaries, prefetching settings) on a single background thread,
+    so that it uses the time the target spends in a break instead of the glitch loop's time.
+
+    Work that doesn't finish within the break keeps running while the loop resumes. Jobs are coalesced by name:
+    submitting a job while one with the same name is still queued replaces the queued one.
+    """
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="break_executor")
+        self._lock = threading.Lock()
+        self._pending: dict[str, Callable] = {}
+        self._futures: list[Future] = []
+        self.errors: list[tuple[str, BaseException]] = []
+
+    def submit(self, name: str, fn: Callable, *args, **kwargs):
+        with self._lock:
+            queued = name in self._pending
+            self._pending[name] = lambda: fn(*args, **kwargs)
+        if not queued:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(self._executor.submit(self._run, name))
+
+    def _run(self, name: str):
+        with self._lock:
+            job = self._pending.pop(name, None)
+        if job is None:
+            return
+        try:
+            job()
+        except BaseException as e:
+            self.errors.append((name, e))
+
+    def busy(self) -> bool:
+        return any(not f.done() for f in self._futures)
+
+    def wait(self, seconds: float) -> bool:
+        """
+        Sleeps for `seconds` while the background work runs. Returns True if all work finished in time.
+        """
+        deadline = time.time() + seconds
+        for future in list(self._futures):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                pass
+        remaining = deadline - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        return not self.busy()
+
+    def drain(self):
+        """
+        Blocks until all queued work is done.
+        """
+        for future in list(self._futures):
+            future.result()
+        self._futures = []
+
+    def shutdown(self):
+        self.drain()
+        self._executor.shutdown(wait=True)
+
+
+class PrefetchingIterator:
+    """
+    Wraps a (not thread-safe) iterator so that the next `chunk_size` items can be generated ahead of time on another thread.
+    """
+    def __init__(self, iterable: Iterable, chunk_size: int = 1000):
+        self._iterator: Iterator = iter(iterable)
+        self._chunk_size = chunk_size
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._exhausted = False
+
+    def prefetch(self):
+        with self._lock:
+            while not self._exhausted and len(self._buffer) < self._chunk_size:
+                try:
+                    self._buffer.append(next(self._iterator))
+                except StopIteration:
+                    self._exhausted = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if self._buffer:
+                return self._buffer.popleft()
+            if self._exhausted:
+                raise StopIteration
+            try:
+                return next(self._iterator)
+            except StopIteration:
+                self._exhausted = True
+                raise
+
+    def buffered(self) -> int:
+        return len(self._buffer)
@@ -0,0 +1,125 @@
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+
+class AdaptiveBreakScheduler:
+    """
+    Decides when the target needs a break based on how the run is going, instead of at fixed try counts.
+
+    The first `window` attempts of the run establish a baseline, which is kept for the rest of the run so a target that
+    degrades slowly doesn't become its own baseline. A break is due when, compared to the baseline, the rolling reset
+    rate rises by more than `reset_rate_margin`, the response latency grows by more than `latency_drift` times, or the
+    scope loses its clock lock.
+
+    Breaks start at `min_break_seconds`. The first full window after a break is compared to the baseline: if the
+    metrics are still degraded, the next break is twice as long (up to `max_break_seconds`); if they recovered, the
+    next one is half as long.
+    """
+    def __init__(self,
+                 window: int = 200,
+                 reset_rate_margin: float = 0.05,
+                 latency_drift: float = 1.5,
+                 min_break_seconds: float = 1,
+                 max_break_seconds: float = 60,
+                 clock_poll_seconds: float = 0.5):
+        self.window = window
+        self.reset_rate_margin = reset_rate_margin
+        self.latency_drift = latency_drift
+        self.min_break_seconds = min_break_seconds
+        self.max_break_seconds = max_break_seconds
+        self.clock_poll_seconds = clock_poll_seconds
+        # check the clock a few times per window
+        self.clock_check_interval = max(1, window // 4)
+        self._resets: deque[bool] = deque(maxlen=window)
+        self._reset_count = 0
+        self._latency: Optional[float] = None
+        self._baseline_reset_rate: Optional[float] = None
+        self._baseline_latency: Optional[float] = None
+        self._clock_locked = True
+        self._break_seconds = min_break_seconds
+        self._checking_recovery = False
+        self.total_break_seconds = 0.0
+        self.total_tries = 0
+        self.breaks_taken = 0
+
+    def record(self, reset: bool, latency: Optional[float] = None, count: int = 1):
+        """
+        Records `count` attempts; `latency` is the time per attempt of a non-reset attempt.
+        """
+        for _ in range(min(count, self.window)):
+            if len(self._resets) == self.window:
+                self._reset_count -= self._resets[0]
+            self._resets.append(reset)
+            self._reset_count += reset
+        self.total_tries += count
+        if latency is not None and not reset:
+            # EWMA over roughly a window of attempts
+            alpha = min(1.0, 2 * count / (self.window + 1))
+            self._latency = latency if self._latency is None else self._latency + alpha * (latency - self._latency)
+        if len(self._resets) == self.window:
+            if self._baseline_reset_rate is None:
+                self._baseline_reset_rate = self.reset_rate
+                self._baseline_latency = self._latency
+            elif self._checking_recovery:
+                # first full window after a break: did the break help?
+                self._checking_recovery = False
+                if self.degraded_reason() is None:
+                    self._break_seconds = max(self.min_break_seconds, self._break_seconds / 2)
+                else:
+                    self._break_seconds = min(self.max_break_seconds, self._break_seconds * 2)
+
+    def record_clock(self, locked: bool):
+        self._clock_locked = locked
+
+    @property
+    def reset_rate(self) -> float:
+        return self._reset_count / len(self._resets) if self._resets else 0.0
+
+    def degraded_reason(self) -> Optional[str]:
+        """
+        Returns why the run is degraded compared to its baseline, or None if it isn't.
+        """
+        if not self._clock_locked:
+            return "clock not locked"
+        if self._baseline_reset_rate is None or len(self._resets) < self.window:
+            return None
+        if self.reset_rate > self._baseline_reset_rate + self.reset_rate_margin:
+            return "reset rate %.1f%% (baseline %.1f%%)" % (self.reset_rate * 100, self._baseline_reset_rate * 100)
+        if self._baseline_latency and self._latency and self._latency > self._baseline_latency * self.latency_drift:
+            return "latency %.1fms (baseline %.1fms)" % (self._latency * 1000, self._baseline_latency * 1000)
+        return None
+
+    def break_seconds(self) -> float:
+        """
+        Returns the length of the break to take now, or 0 if no break is needed.
+        """
+        if self._checking_recovery and self._clock_locked:
+            # wait for a full window of attempts before judging the last break
+            return 0
+        return self._break_seconds if self.degraded_reason() is not None else 0
+
+    def take_break(self, seconds: float, clock_locked: Callable[[], bool], sleep: Callable[[float], Any] = time.sleep) -> float:
+        """
+        Sleeps for `seconds`, then keeps waiting (up to `max_break_seconds`) until the clock is locked again.
+        Returns the time spent in the break.
+        """
+        start = time.time()
+        sleep(seconds)
+        while not clock_locked() and time.time() - start < self.max_break_seconds:
+            time.sleep(self.clock_poll_seconds)
+        self._clock_locked = clock_locked()
+        elapsed = time.time() - start
+        self.total_break_seconds += elapsed
+        self.breaks_taken += 1
+        # measure recovery on a fresh window
+        self._resets.clear()
+        self._reset_count = 0
+        self._checking_recovery = True
+        return elapsed
+
+    def break_seconds_per_try(self) -> float:
+        """
+        Returns the average break time per attempt so far, for estimating the remaining run time.
+        """
+        return self.total_break_seconds / self.total_tries if self.total_tries else 0.0
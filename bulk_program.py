@@ -0,0 +1,121 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from programmer_n76_icp import N76ICPProgrammer, FirmwareImage, VERIFY_MODES, newaeUSBICPLib
+
+
+def default_scope_factory(serial_number: str):
+    import chipwhisperer as cw
+    return cw.scope(sn=serial_number)
+
+
+def mock_scope_factory(serial_number: str):
+    from mocks.mock_scope import MockOpenADC
+    scope = MockOpenADC()
+    scope.con(sn=serial_number)
+    return scope
+
+
+def program_device(serial_number: str, image_path: str, scope_factory: Callable[[str], Any] = default_scope_factory,
+                   verify: bool = True, logfunc=print, **programmer_args) -> dict[str, Any]:
+    """
+    Connects to the scope with `serial_number` and programs its target with `image_path` the way `cw.program_target` does.
+    Never raises; failures are reported in the result's "error", and "verify" is "passed", "failed" or "not run".
+    "bytes_per_second" only counts the time spent in `program()`, not connecting, finding or erasing.
+    """
+    result = {"serial_number": serial_number, "uid": None, "seconds": None, "bytes_per_second": None,
+              "verify": "not run", "ok": False, "error": None}
+    device_log = lambda *args: logfunc("[{}]".format(serial_number), *args)
+    image = None
+    scope = None
+    programmer = None
+    program_seconds = None
+    start_time = time.time()
+    try:
+        image = FirmwareImage.from_file(image_path)
+        scope = scope_factory(serial_number)
+        programmer = N76ICPProgrammer(logfunc=device_log, scope=scope, **programmer_args)
+        programmer.open()
+        programmer.find()
+        programmer.erase()
+        program_start_time = time.time()
+        try:
+            programmer.program(image_path, memtype="flash", verify=verify)
+        finally:
+            if programmer.last_verify is not None:
+                result["verify"] = "passed" if programmer.last_verify else "failed"
+        program_seconds = time.time() - program_start_time
+        result["uid"] = programmer.last_uid
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    finally:
+        if programmer is not None:
+            try:
+                programmer.close()
+            except Exception as e:
+                device_log("Failed to close the programmer: {}".format(e))
+        if scope is not None:
+            try:
+                scope.dis()
+            except Exception as e:
+                device_log("Failed to disconnect: {}".format(e))
+    result["seconds"] = time.time() - start_time
+    if result["ok"] and program_seconds:
+        result["bytes_per_second"] = len(image.flash_data) / program_seconds
+    return result
+
+
+def program_devices(serial_numbers: list[str], image_path: str, scope_factory: Callable[[str], Any] = default_scope_factory,
+                    verify: bool = True, logfunc=print, max_workers: Optional[int] = None, **programmer_args) -> list[dict[str, Any]]:
+    """
+    Programs and verifies the targets of several scopes concurrently, one worker thread per scope.
+
+    Args:
+      - serial_numbers (`list[str]`): The serial numbers of the scopes.
+      - image_path (`str`): The firmware image (.hex or .bin) flashed to every target.
+      - scope_factory (`Callable[[str], Any]`) [default = `default_scope_factory`]: Connects to a scope by serial number. `mock_scope_factory` for mock scopes with simulated targets.
+      - verify (`bool`) [default = `True`]: Whether to verify the writes.
+      - max_workers (`Optional[int]`) [default = `None`]: The maximum number of scopes programmed at once. `None` for all of them.
+      - programmer_args: Passed to `N76ICPProgrammer` (e.g. `config_bytes`, `verify_mode`, `differential`, `negotiate_read_sizes`).
+
+    Returns:
+      One result per scope, in the order of `serial_numbers`: {"serial_number", "uid", "seconds", "bytes_per_second", "verify", "ok", "error"}.
+    """
+    # parse the image once, the workers get it from the cache
+    FirmwareImage.from_file(image_path)
+    if not serial_numbers:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or len(serial_numbers)) as executor:
+        futures = [executor.submit(program_device, serial_number, image_path, scope_factory, verify, logfunc, **programmer_args)
+                   for serial_number in serial_numbers]
+        return [future.result() for future in futures]
+
+
+def print_results(results: list[dict[str, Any]], logfunc=print):
+    for result in results:
+        if result["ok"]:
+            throughput = " ({:.1f} KB/s)".format(result["bytes_per_second"] / 1024) if result["bytes_per_second"] else ""
+            logfunc("{serial_number}: OK, UID {uid}, {seconds:.2f}s{throughput}, verify: {verify}".format(throughput=throughput, **result))
+        else:
+            logfunc("{serial_number}: FAILED after {seconds:.2f}s, verify: {verify}: {error}".format(**result))
+    logfunc("{}/{} devices programmed".format(sum(result["ok"] for result in results), len(results)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Program the same image to the N76E003 targets of several ChipWhisperers at once.")
+    parser.add_argument("image", help="Firmware image (.hex or .bin)")
+    parser.add_argument("serial_numbers", nargs="+", help="Scope serial numbers")
+    parser.add_argument("--no-verify", action="store_true", help="Don't verify the writes")
+    parser.add_argument("--verify-mode", choices=VERIFY_MODES, default="full")
+    parser.add_argument("--differential", action="store_true", help="Only rewrite the pages that changed")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--read-chunk-size", type=int, default=newaeUSBICPLib.READ_CHUNK_SIZE, help="Bytes per USB control transfer when reading")
+    parser.add_argument("--negotiate", action="store_true", help="Use the largest USB control transfer size each scope handles")
+    parser.add_argument("--mock", action="store_true", help="Use mock scopes with simulated targets")
+    args = parser.parse_args()
+    results = program_devices(args.serial_numbers, args.image, mock_scope_factory if args.mock else default_scope_factory,
+                              verify=not args.no_verify, max_workers=args.max_workers, verify_mode=args.verify_mode,
+                              differential=args.differential, read_chunk_size=args.read_chunk_size, negotiate_read_sizes=args.negotiate)
+    print_results(results)
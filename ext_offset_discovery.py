@@ -0,0 +1,108 @@
+import json
+import math
+from typing import Optional, Union
+import numpy as np
+from glitch_params import GlitchControllerParams
+from trace_stats import GroupedTraceStats
+from adc_tuning import find_activity_window
+
+DEFAULT_DISCOVERY_CAPTURES = 50
+# autocorrelation peaks below this aren't considered periodic
+MIN_PERIOD_CORRELATION = 0.3
+
+
+def find_loop_period(trace: np.ndarray, min_period: int = 4, max_period: Optional[int] = None) -> Optional[tuple[int, float]]:
+    """
+    Finds the dominant period (in samples) of a trace from its autocorrelation.
+    Returns (period, autocorrelation at that lag), or None if the trace isn't periodic.
+    """
+    x = np.asarray(trace, dtype=np.float64)
+    x = x - x.mean()
+    n = len(x)
+    if max_period is None:
+        max_period = n // 2
+    spectrum = np.fft.rfft(x, 2 * n)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:n]
+    if autocorr[0] <= 0:
+        return None
+    autocorr /= autocorr[0]
+    # the first peak after the central lobe
+    negative = np.nonzero(autocorr[:max_period] < 0)[0]
+    if len(negative) == 0:
+        return None
+    first_lag = max(min_period, int(negative[0]))
+    if first_lag >= max_period:
+        return None
+    period = first_lag + int(np.argmax(autocorr[first_lag:max_period]))
+    if autocorr[period] < MIN_PERIOD_CORRELATION:
+        return None
+    return period, float(autocorr[period])
+
+
+def propose_ext_offset_range(mean_trace: np.ndarray, adc_offset: int, samples_per_cycle: float, periods: int = 1, margin_cycles: int = 2) -> Optional[list[int]]:
+    """
+    Proposes an ext_offset range (in clock cycles after the trigger) covering `periods` iterations of the target loop,
+    starting where the activity in the trace begins.
+    """
+    found = find_loop_period(mean_trace)
+    if found is None:
+        return None
+    period, _ = found
+    activity = find_activity_window([mean_trace], margin=0)
+    start_sample = activity[0] if activity else 0
+    start_cycle = max(0, math.floor((adc_offset + start_sample) / samples_per_cycle) - margin_cycles)
+    end_cycle = math.ceil((adc_offset + start_sample + periods * period) / samples_per_cycle) + margin_cycles
+    return [start_cycle, end_cycle, 1]
+
+
+def mean_of_captures(captures: Union[np.ndarray, GroupedTraceStats]) -> np.ndarray:
+    """
+    Returns the mean trace of what `capture_sequence` returned (traces, or online stats of the "normal" traces).
+    """
+    if isinstance(captures, GroupedTraceStats):
+        if "normal" not in captures:
+            raise ValueError("No normal traces were captured (got %s), can't compute the mean trace" % (", ".join(captures.groups) or "none"))
+        return captures["normal"].mean
+    return np.mean(captures, axis=0)
+
+
+def num_captures(captures: Union[np.ndarray, GroupedTraceStats]) -> int:
+    """
+    Returns the number of traces in what `capture_sequence` returned.
+    """
+    if isinstance(captures, GroupedTraceStats):
+        return sum(stats.count for stats in captures.groups.values())
+    return len(captures)
+
+
+def discover_ext_offset_range(test, captures: int = DEFAULT_DISCOVERY_CAPTURES, name: str = "", periods: int = 1,
+                              output_path: Optional[str] = None) -> Optional[GlitchControllerParams]:
+    """
+    Captures `captures` traces of the test's target operation with `capture_sequence`, finds the period of the target loop
+    and returns a copy of the test's GlitchControllerParams with the proposed ext_offset_range.
+    The proposal is written to `output_path` as GlitchControllerParams JSON if given.
+    """
+    clkgen_freq = test.scope.clock.clkgen_freq
+    if not clkgen_freq:
+        raise ValueError("scope.clock.clkgen_freq is %s, can't convert ADC samples to target clock cycles" % str(clkgen_freq))
+    data = test.capture_sequence(captures, name if name else test.name + "_ext_offset_discovery")
+    if data is None or num_captures(data) == 0:
+        test.logger.error("No traces captured, can't discover ext_offset range")
+        return None
+    mean_trace = mean_of_captures(data)
+    samples_per_cycle = test.scope.clock.adc_freq / clkgen_freq
+    found = find_loop_period(mean_trace)
+    ext_offset_range = propose_ext_offset_range(mean_trace, test.scope.adc.offset, samples_per_cycle, periods)
+    if found is None or ext_offset_range is None:
+        test.logger.warn("*** No periodic structure found in the traces, keeping ext_offset_range %s" % str(test.glitch_params.ext_offset_range))
+        return None
+    test.logger.info("*** Loop period: %d samples = %.1f cycles (autocorrelation %.2f)" % (found[0], found[0] / samples_per_cycle, found[1]))
+    test.logger.info("*** Proposed ext_offset_range: %s (was %s)" % (str(ext_offset_range), str(test.glitch_params.ext_offset_range)))
+    params = GlitchControllerParams()
+    params.from_json(test.glitch_params.to_json())
+    params.ext_offset_range = ext_offset_range
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(json.dumps(params.to_json(), indent=4))
+        test.logger.info("*** Glitch params written to %s" % output_path)
+    return params
@@ -405,6 +405,19 @@ class GlitchControllerParams:
         return ((math.floor(int((range_val[1] - range_val[0]) / _step_size))) - steps_to_skip) + 1
 
 
+    def get_param_values(self, param_name) -> list:
+        """
+        Returns the values the glitch controller will step through for a parameter (including 0 width/offset values).
+        """
+        range_val = getattr(self, param_name + "_range")
+        if not isinstance(range_val, list) or range_val[2] == 0:
+            return [range_val[0] if isinstance(range_val, list) else range_val]
+        steps = range_val[2] if isinstance(range_val[2], list) else [range_val[2]]
+        values = []
+        for step in steps:
+            values += [range_val[0] + i * step for i in range(self.get_number_of_steps(param_name, False, step))]
+        return values
+
     def get_number_of_iters(self, skip_0_width_offset_range=True):
         """
         Returns the number of possible iterations for the glitch controller.
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Any, Optional
+from programmer_n76_icp import N76E003, NU51_PAGE_SIZE, NU51_CONFIG_ADDR, NU51_CONFIG_LEN, newaeUSBICPLib
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_RETRIES = 3
+
+
+def _write_json(path: str, data: Any):
+    # write to a temp file and rename, so an interrupted dump never leaves a half-written progress map
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _load_json(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def page_hashes(data: bytes, page_size: int = NU51_PAGE_SIZE) -> list[str]:
+    """
+    Returns a short digest of every `page_size` page of `data`.
+    """
+    return [hashlib.blake2b(data[addr:addr + page_size], digest_size=8).hexdigest() for addr in range(0, len(data), page_size)]
+
+
+def compare_page_hashes(old: list[str], new: list[str], addr: int = 0) -> list[int]:
+    """
+    Returns the addresses of the pages whose hashes differ (or that only one of the dumps has).
+    """
+    return [addr + i * NU51_PAGE_SIZE for i in range(max(len(old), len(new)))
+            if i >= len(old) or i >= len(new) or old[i] != new[i]]
+
+
+def dump_memory(lib: newaeUSBICPLib, path: str, addr: int, length: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                retries: int = DEFAULT_RETRIES, reenter_on_retry: bool = True, logfunc=print) -> dict[str, Any]:
+    """
+    Dumps [addr, addr + length) to `path`, `chunk_size` bytes at a time, retrying each chunk up to `retries` times.
+
+    Every chunk is written to disk as soon as it's read and recorded in the progress map `<path>.progress.json`, so an
+    interrupted dump resumes from the chunks that are missing. Once complete, the per-page hashes are saved to
+    `<path>.hashes.json` and compared with the previous complete dump of the same range.
+
+    Returns {"bytes_read", "seconds", "bytes_per_second", "resumed_chunks", "retries", "changed_pages"}, where
+    "changed_pages" is None if there's no previous dump to compare with.
+    """
+    progress_path = path + ".progress.json"
+    hashes_path = path + ".hashes.json"
+    chunks = [(offset, min(chunk_size, length - offset)) for offset in range(0, length, chunk_size)]
+    progress = _load_json(progress_path)
+    if not progress or progress["addr"] != addr or progress["length"] != length or progress["chunk_size"] != chunk_size \
+            or progress["complete"] or not os.path.exists(path):
+        progress = {"addr": addr, "length": length, "chunk_size": chunk_size, "complete": False, "done": []}
+        with open(path, "wb") as f:
+            f.write(b"\xff" * length)
+    done = set(progress["done"])
+    result = {"bytes_read": 0, "seconds": 0.0, "bytes_per_second": None, "resumed_chunks": len(done), "retries": 0, "changed_pages": None}
+    if done:
+        logfunc("Resuming dump of 0x{:05x}, {}/{} chunks already done".format(addr, len(done), len(chunks)))
+    start_time = time.time()
+    with open(path, "r+b") as f:
+        for index, (offset, chunk_length) in enumerate(chunks):
+            if index in done:
+                continue
+            for attempt in range(retries + 1):
+                try:
+                    data = lib.read_flash(addr + offset, chunk_length)
+                    if len(data) != chunk_length:
+                        raise IOError("Short read: {} of {} bytes".format(len(data), chunk_length))
+                    break
+                except Exception as e:
+                    if attempt == retries:
+                        _write_json(progress_path, progress)
+                        raise IOError("Failed to read 0x{:05x} after {} retries: {}".format(addr + offset, retries, e))
+                    result["retries"] += 1
+                    logfunc("Read of 0x{:05x} failed ({}), retrying".format(addr + offset, e))
+                    if reenter_on_retry:
+                        try:
+                            lib.reentry()
+                        except Exception as e:
+                            logfunc("ICP reentry failed: {}".format(e))
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            result["bytes_read"] += chunk_length
+            progress["done"].append(index)
+            _write_json(progress_path, progress)
+    result["seconds"] = time.time() - start_time
+    if result["seconds"] > 0:
+        result["bytes_per_second"] = result["bytes_read"] / result["seconds"]
+    with open(path, "rb") as f:
+        hashes = page_hashes(f.read())
+    previous = _load_json(hashes_path)
+    if previous and previous["addr"] == addr and previous["length"] == length:
+        result["changed_pages"] = compare_page_hashes(previous["page_hashes"], hashes, addr)
+    _write_json(hashes_path, {"addr": addr, "length": length, "page_hashes": hashes, "time": time.time()})
+    progress["complete"] = True
+    _write_json(progress_path, progress)
+    return result
+
+
+def dump_device(lib: newaeUSBICPLib, out_dir: str, name: str = "dump", flash_size: int = N76E003.flash_size,
+                chunk_size: int = DEFAULT_CHUNK_SIZE, retries: int = DEFAULT_RETRIES, logfunc=print) -> dict[str, dict[str, Any]]:
+    """
+    Dumps the flash to `<out_dir>/<name>_flash.bin` and the config bytes to `<out_dir>/<name>_config.bin` with
+    `dump_memory`, and reports the throughput and the pages that changed since the last dump. `lib` must be in ICP mode.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = {
+        "flash": dump_memory(lib, os.path.join(out_dir, name + "_flash.bin"), 0, flash_size, chunk_size, retries, logfunc=logfunc),
+        "config": dump_memory(lib, os.path.join(out_dir, name + "_config.bin"), NU51_CONFIG_ADDR, NU51_CONFIG_LEN, chunk_size, retries, logfunc=logfunc),
+    }
+    for memory, result in results.items():
+        if result["bytes_per_second"] is not None:
+            logfunc("{}: read {} bytes in {:.2f}s ({:.1f} KB/s), {} retries".format(memory, result["bytes_read"], result["seconds"],
+                                                                                   result["bytes_per_second"] / 1024, result["retries"]))
+        if result["changed_pages"] is None:
+            logfunc("{}: no previous dump to compare with".format(memory))
+        elif result["changed_pages"]:
+            logfunc("{}: {} pages changed since the last dump: {}".format(memory, len(result["changed_pages"]),
+                                                                      ", ".join("0x{:05x}".format(page) for page in result["changed_pages"])))
+        else:
+            logfunc("{}: unchanged since the last dump".format(memory))
+    return results
+
+
+if __name__ == "__main__":
+    from nuvoprogpy.nuvo51icpy.nuvo51icpy import Nuvo51ICP
+    parser = argparse.ArgumentParser(description="Dump the flash and config bytes of an N76E003 over ICP, resuming interrupted dumps.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--name", default="dump")
+    parser.add_argument("--sn", default=None, help="Scope serial number")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--read-chunk-size", type=int, default=newaeUSBICPLib.READ_CHUNK_SIZE, help="Bytes per USB control transfer when reading")
+    parser.add_argument("--negotiate", action="store_true", help="Use the largest USB control transfer size the scope handles")
+    parser.add_argument("--mock", action="store_true", help="Use a mock scope with a simulated target")
+    args = parser.parse_args()
+    if args.mock:
+        from mocks.mock_scope import MockOpenADC
+        scope = MockOpenADC()
+        scope.con(sn=args.sn)
+    else:
+        import chipwhisperer as cw
+        scope = cw.scope(sn=args.sn)
+    try:
+        lib = newaeUSBICPLib(scope, read_chunk_size=args.read_chunk_size)
+        with Nuvo51ICP(library=lib):
+            if args.negotiate:
+                print("Reading with a {} byte buffer in {} byte transfers".format(*lib.negotiate_read_sizes()))
+            dump_device(lib, args.out_dir, args.name, chunk_size=args.chunk_size, retries=args.retries)
+    finally:
+        scope.dis()
@@ -0,0 +1,263 @@
+import os
+import time
+from typing import Optional
+from programmer_n76_icp import N76E003, NU51_PAGE_SIZE, NU51_CONFIG_ADDR, NUVO_PREFIX_LEN, packuint16, packuint32, unpackuint16, unpackuint32, \
+    NUVO_CMD_CONNECT, NUVO_CMD_GET_DEVICEID, NUVO_CMD_READ_FLASH, NUVO_CMD_PAGE_ERASE, NUVO_CMD_RESET, NUVO_CMD_GET_UID, NUVO_CMD_GET_CID, \
+    NUVO_CMD_GET_UCID, NUVO_CMD_MASS_ERASE, NUVO_CMD_ENTER_ICP_MODE, NUVO_CMD_EXIT_ICP_MODE, NUVO_CMD_REENTER_ICP, NUVO_CMD_REENTRY_GLITCH, \
+    NUVO_CMD_WRITE_FLASH, NUVO_SET_PROG_TIME, NUVO_SET_PAGE_ERASE_TIME, NUVO_SET_MASS_ERASE_TIME, NUVO_CMD_GET_PID, NUVO_GET_RAMBUF, \
+    NUVO_SET_RAMBUF, NUVO_GET_STATUS, NUVO_ERR_OK, NUVO_ERR_FAILED, NUVO_ERR_INCORRECT_PARAMS, NUVO_ERR_WRITE_FAILED, NUVO_ERR_READ_FAILED
+
+NUVOTON_CID = 0xDA
+# CONFIG0 bit 1 is cleared to lock the device
+CONFIG0_LOCK = 0x02
+# CONFIG1 bits 2:0 select the LDROM size, 0b111 for none, each step down adds 1KB (up to 4KB)
+CONFIG1_LDSIZE_MASK = 0x07
+
+
+class MockN76ICPDevice:
+    """
+    Simulates the ICP side of the CW-Lite firmware (REQ_NU51_ICP_PROGRAM control requests) with an N76E003 attached.
+
+    The 18KB flash holds the APROM followed by the LDROM (sized by CONFIG1), the config bytes are in a separate page at
+    NU51_CONFIG_ADDR. Like real flash, writes can only clear bits, so unerased pages end up with the AND of old and new data.
+    Page erase erases one page, mass erase erases everything including the config bytes. While the config bytes lock
+    the device, flash reads return 0xFF and only mass erase and config reads work.
+
+    Every control transfer costs `transfer_latency` seconds plus `byte_latency` seconds per byte, and erases and writes
+    cost the times set with the NUVO_SET_*_TIME commands. With `realtime` the simulator sleeps for it, otherwise it's
+    only added up in `simulated_seconds`, along with the transfer and byte counts, so benchmarks can compare round trips
+    without waiting for them.
+    """
+    def __init__(self, ram_buffer_size: int = 256, max_ctrl_transfer: int = 256, transfer_latency: float = 0.0005,
+                 byte_latency: float = 0.0, realtime: bool = False, uid: Optional[bytes] = None, ucid: Optional[bytes] = None):
+        self.ram_buffer_size = ram_buffer_size
+        self.max_ctrl_transfer = max_ctrl_transfer
+        self.transfer_latency = transfer_latency
+        self.byte_latency = byte_latency
+        self.realtime = realtime
+        self.device_id = N76E003.signature
+        self.pid = 0x0000
+        self.cid = NUVOTON_CID
+        self.uid = bytes(uid) if uid is not None else os.urandom(12)
+        self.ucid = bytes(ucid) if ucid is not None else os.urandom(16)
+        self.flash = bytearray(b"\xff" * N76E003.flash_size)
+        self.config = bytearray(b"\xff" * NU51_PAGE_SIZE)
+        self.ram = bytearray(ram_buffer_size)
+        self.status = bytearray(NUVO_PREFIX_LEN)
+        self.in_icp = False
+        # (delay_us, hold_us)
+        self.program_time = (20, 0)
+        self.page_erase_time = (5000, 0)
+        self.mass_erase_time = (50000, 0)
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transfers = 0
+        self.bytes_transferred = 0
+        self.simulated_seconds = 0.0
+        # command -> number of times sent
+        self.commands = {}
+
+    @property
+    def locked(self) -> bool:
+        return not self.config[0] & CONFIG0_LOCK
+
+    @property
+    def ldrom_size(self) -> int:
+        return min(4, CONFIG1_LDSIZE_MASK - (self.config[1] & CONFIG1_LDSIZE_MASK)) * 1024
+
+    @property
+    def aprom(self) -> bytearray:
+        return self.flash[:len(self.flash) - self.ldrom_size]
+
+    @property
+    def ldrom(self) -> bytearray:
+        return self.flash[len(self.flash) - self.ldrom_size:]
+
+    def _wait(self, seconds: float):
+        self.simulated_seconds += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def _transfer(self, nbytes: int):
+        if nbytes > self.max_ctrl_transfer:
+            raise IOError("Control transfer of {} bytes is larger than the endpoint buffer ({})".format(nbytes, self.max_ctrl_transfer))
+        self.transfers += 1
+        self.bytes_transferred += nbytes
+        self._wait(self.transfer_latency + nbytes * self.byte_latency)
+
+    def _set_status(self, cmd: int, err: int, data: bytes = b""):
+        self.status = bytearray([cmd, err, 0]) + bytearray(data)
+
+    def _memory(self, addr: int, length: int) -> Optional[tuple[bytearray, int]]:
+        """
+        Returns the memory `addr` is in and the offset into it, or None if [addr, addr + length) isn't all in one memory.
+        """
+        if 0 <= addr and addr + length <= len(self.flash):
+            return self.flash, addr
+        if NU51_CONFIG_ADDR <= addr and addr + length <= NU51_CONFIG_ADDR + len(self.config):
+            return self.config, addr - NU51_CONFIG_ADDR
+        return None
+
+    def _enter_icp(self, data: bytearray):
+        self.in_icp = True
+        return NUVO_ERR_OK, b""
+
+    def _enter_icp_mode(self, data: bytearray):
+        self.in_icp = True
+        return NUVO_ERR_OK, packuint32(0)
+
+    def _exit_icp(self, data: bytearray):
+        self.in_icp = False
+        return NUVO_ERR_OK, b""
+
+    def _id_command(self, value: bytes):
+        def handler(data: bytearray):
+            if not self.in_icp:
+                return NUVO_ERR_FAILED, b""
+            return NUVO_ERR_OK, value
+        return handler
+
+    def _set_time(self, attr: str):
+        def handler(data: bytearray):
+            if len(data) != 8:
+                return NUVO_ERR_INCORRECT_PARAMS, b""
+            setattr(self, attr, (unpackuint32(data, 0), unpackuint32(data, 4)))
+            return NUVO_ERR_OK, b""
+        return handler
+
+    def _read_flash(self, data: bytearray):
+        addr = unpackuint32(data, 0)
+        length = unpackuint16(data, 4)
+        memory = self._memory(addr, length)
+        if length > self.ram_buffer_size or memory is None:
+            return NUVO_ERR_INCORRECT_PARAMS, b""
+        if not self.in_icp:
+            return NUVO_ERR_READ_FAILED, b""
+        mem, offset = memory
+        if self.locked and mem is self.flash:
+            self.ram[:length] = b"\xff" * length
+        else:
+            self.ram[:length] = mem[offset:offset + length]
+        return NUVO_ERR_OK, b""
+
+    def _set_rambuf(self, offset: int, data: bytearray):
+        if offset + len(data) > self.ram_buffer_size:
+            return NUVO_ERR_INCORRECT_PARAMS, b""
+        self.ram[offset:offset + len(data)] = data
+        return NUVO_ERR_OK, b""
+
+    def _write_flash(self, data: bytearray):
+        addr = unpackuint32(data, 0)
+        length = unpackuint16(data, 4)
+        memory = self._memory(addr, length)
+        if length > self.ram_buffer_size or memory is None:
+            return NUVO_ERR_INCORRECT_PARAMS, b""
+        if not self.in_icp or (self.locked and memory[0] is self.flash):
+            return NUVO_ERR_WRITE_FAILED, b""
+        mem, offset = memory
+        for i in range(length):
+            mem[offset + i] &= self.ram[i]
+        self._wait(length * sum(self.program_time) / 1e6)
+        return NUVO_ERR_OK, packuint16(sum(self.ram[:length]) & 0xffff)
+
+    def _page_erase(self, data: bytearray):
+        addr = unpackuint32(data, 0) & ~(NU51_PAGE_SIZE - 1)
+        memory = self._memory(addr, NU51_PAGE_SIZE)
+        if memory is None:
+            return NUVO_ERR_INCORRECT_PARAMS, b""
+        if not self.in_icp or (self.locked and memory[0] is self.flash):
+            return NUVO_ERR_FAILED, b""
+        mem, offset = memory
+        mem[offset:offset + NU51_PAGE_SIZE] = b"\xff" * NU51_PAGE_SIZE
+        self._wait(sum(self.page_erase_time) / 1e6)
+        return NUVO_ERR_OK, b""
+
+    def _mass_erase(self, data: bytearray):
+        if not self.in_icp:
+            return NUVO_ERR_FAILED, b""
+        self.flash[:] = b"\xff" * len(self.flash)
+        self.config[:] = b"\xff" * len(self.config)
+        self._wait(sum(self.mass_erase_time) / 1e6)
+        return NUVO_ERR_OK, b""
+
+    def _handlers(self):
+        return {
+            NUVO_CMD_CONNECT: self._enter_icp,
+            NUVO_CMD_ENTER_ICP_MODE: self._enter_icp_mode,
+            NUVO_CMD_EXIT_ICP_MODE: self._exit_icp,
+            NUVO_CMD_REENTER_ICP: self._enter_icp,
+            NUVO_CMD_REENTRY_GLITCH: self._enter_icp,
+            NUVO_CMD_RESET: self._exit_icp,
+            NUVO_CMD_GET_DEVICEID: self._id_command(packuint32(self.device_id)),
+            NUVO_CMD_GET_PID: self._id_command(packuint32(self.pid)),
+            NUVO_CMD_GET_CID: self._id_command(packuint32(self.cid)),
+            NUVO_CMD_GET_UID: self._id_command(self.uid),
+            NUVO_CMD_GET_UCID: self._id_command(self.ucid),
+            NUVO_SET_PROG_TIME: self._set_time("program_time"),
+            NUVO_SET_PAGE_ERASE_TIME: self._set_time("page_erase_time"),
+            NUVO_SET_MASS_ERASE_TIME: self._set_time("mass_erase_time"),
+            NUVO_CMD_READ_FLASH: self._read_flash,
+            NUVO_CMD_WRITE_FLASH: self._write_flash,
+            NUVO_CMD_PAGE_ERASE: self._page_erase,
+            NUVO_CMD_MASS_ERASE: self._mass_erase,
+        }
+
+    def sendCtrl(self, value: int, data: bytearray):
+        self._transfer(len(data))
+        cmd = value & 0xFF
+        self.commands[cmd] = self.commands.get(cmd, 0) + 1
+        if cmd == NUVO_SET_RAMBUF:
+            err, response = self._set_rambuf((value >> 8) & 0xFF, bytearray(data))
+        else:
+            handler = self._handlers().get(cmd)
+            if handler is None:
+                self._set_status(cmd, NUVO_ERR_FAILED)
+                return
+            err, response = handler(bytearray(data))
+        self._set_status(cmd, err, response)
+
+    def readCtrl(self, value: int, dlen: int) -> bytearray:
+        self._transfer(dlen)
+        cmd = value & 0xFF
+        if cmd == NUVO_GET_STATUS:
+            return bytearray(self.status[:dlen]) + bytearray(max(0, dlen - len(self.status)))
+        if cmd == NUVO_GET_RAMBUF:
+            offset = (value >> 8) & 0xFF
+            return bytearray(self.ram[offset:offset + dlen])
+        raise IOError("Unknown ICP read request {:02x}".format(cmd))
+
+
+def _benchmark(device: MockN76ICPDevice, length: int, repeats: int, func) -> dict[str, float]:
+    device.reset_counters()
+    for _ in range(repeats):
+        func()
+    seconds = device.simulated_seconds / repeats
+    return {"length": length, "transfers": device.transfers / repeats, "simulated_seconds": seconds,
+            "bytes_per_second": length / seconds if seconds else float("inf")}
+
+
+def benchmark_read_flash(lib, device: MockN76ICPDevice, length: Optional[int] = None, repeats: int = 3) -> dict[str, float]:
+    """
+    Reads `length` bytes (the whole flash by default) `repeats` times with `lib` (a newaeUSBICPLib on a mock scope)
+    and returns the control transfers, simulated seconds and simulated bytes/s per read, for regression benchmarks.
+    """
+    if length is None:
+        length = len(device.flash)
+    device.in_icp = True
+    return _benchmark(device, length, repeats, lambda: lib.read_flash(0, length))
+
+
+def benchmark_write_flash(lib, device: MockN76ICPDevice, data: Optional[bytes] = None, repeats: int = 3) -> dict[str, float]:
+    """
+    Mass erases and writes `data` (random data the size of the APROM by default) `repeats` times with `lib`, and returns
+    the same figures as `benchmark_read_flash`, including the simulated erase and programming times.
+    """
+    if data is None:
+        data = os.urandom(len(device.aprom))
+    device.in_icp = True
+
+    def erase_and_write():
+        lib.mass_erase()
+        lib.write_flash(0, data)
+    return _benchmark(device, len(data), repeats, erase_and_write)
@@ -293,6 +293,7 @@ class MockOpenADC(OpenADC):
         self.current_mock_targets: list[MockSim] = []
         self.reset_rate = 0.0
         self.success_rate = 0.0
+        self.glitch_write_latency = {"width": 0.002, "offset": 0.002, "ext_offset": 0.0001, "repeat": 0.0001}
     
     # mock functions
     @property
@@ -319,13 +320,27 @@ class MockOpenADC(OpenADC):
     def success_rate(self, rate: float):
         self._success_rate = rate
 
+    @property
+    def glitch_write_latency(self) -> dict[str, float]:
+        """
+        Latency model (in seconds) for writing each glitch parameter, used by the param order optimizer.
+
+        Defaults to width/offset being slow (DCM phase shift on the CW-Lite) and ext_offset/repeat being cheap register writes.
+        """
+        return self._glitch_write_latency
+    @glitch_write_latency.setter
+    def glitch_write_latency(self, latency: dict[str, float]):
+        self._glitch_write_latency = latency
+
     def mock_trigger_callback(self, high: bool) -> int:
         if high:
             self.waiting_for_trigger_high = False
         was_armed = self.sc.is_armed == 1
         if high:
             self.sc.triggerNow()
-        if high and was_armed and ((self.io.glitch_hp or self.io.glitch_lp or (self._is_husky and self.glitch.enabled)) or self.io.hs2 == 'glitch'):
+        # ext_continuous glitches on every trigger, not just the first one after arming
+        continuous = high and self.glitch.trigger_src == "ext_continuous"
+        if high and (was_armed or continuous) and ((self.io.glitch_hp or self.io.glitch_lp or (self._is_husky and self.glitch.enabled)) or self.io.hs2 == 'glitch'):
             res = np.random.rand()
             if res < self.success_rate:
                 return 1
@@ -72,21 +72,48 @@ class SimpleSerial2TargetSim(MockSim):
         self.send_response('r', [ord(x) for x in self.cmds.keys()])
         return SS_ERR_OK
 
-    def glitch_loop(self, cmd, scmd, length, data):
+    def _run_glitch_loop(self):
+        """
+        One attempt of the glitch loop; returns the count, or None if the target reset
+        """
         cnt = 0
         res = self.trigger_callback(True)
         if res == RESET_RESULT:
-            return self.reset()
+            return None
         elif res == SUCCESS_RESULT:
             cnt = 1
         for i in range(50):
             for j in range(50):
                 cnt += 1
         self.trigger_callback(False)
+        return cnt
+
+    def glitch_loop(self, cmd, scmd, length, data):
+        cnt = self._run_glitch_loop()
+        if cnt is None:
+            return self.reset()
         res = [cnt & 0xFF, (cnt >> 8) & 0xFF, (cnt >> 16) & 0xFF, (cnt >> 24) & 0xFF]
         self.send_response('r', res)
         return SS_ERR_OK if cnt == 2500 else 0x10
 
+    def glitch_loop_burst(self, cmd, scmd, length, data):
+        """
+        Runs the glitch loop data[0] times and sends back all of the counts in one response
+        """
+        attempts = data[0] if length > 0 else 1
+        if attempts * 4 > 255:
+            return SS_ERR_LEN
+        res = []
+        all_normal = True
+        for _ in range(attempts):
+            cnt = self._run_glitch_loop()
+            if cnt is None:
+                return self.reset()
+            all_normal = all_normal and cnt == 2500
+            res.extend([cnt & 0xFF, (cnt >> 8) & 0xFF, (cnt >> 16) & 0xFF, (cnt >> 24) & 0xFF])
+        self.send_response('r', res)
+        return SS_ERR_OK if all_normal else 0x10
+
 
     def glitch_comparison(self, cmd, scmd, length, data):
         ok = 5
@@ -271,6 +298,7 @@ class SimpleSerial2TargetSim(MockSim):
             'v': self.check_version,
             'w': self.get_commands,
             'g': self.glitch_loop,
+            'b': self.glitch_loop_burst,
             'c': self.glitch_comparison,
             't': self.toggle_external_clock,
             '\x01': self.password,
@@ -671,6 +671,8 @@ class MockNAEUSBBackend:
         return self.device.getProductId()
 
 from chipwhisperer.hardware.naeusb.programmer_avr import AVRISP
+from programmer_n76_icp import REQ_NU51_ICP_PROGRAM
+from .mock_icp_sim import MockN76ICPDevice
 
 class NAEUSBIface:
     CMD_FW_VERSION = 0x17
@@ -858,6 +860,7 @@ class MockNAEUSB(NAEUSBIface):
         self._max_num_samples = 0
         self._led_settings = 0
         self.cdc_settings = (1, 1, 0, 0)
+        self.mock_icp = MockN76ICPDevice()
 
     # only used for the FPGA programmer; not necessary to implement
     def writeBulkEP(self, data : bytearray, timeout = None):
@@ -907,7 +910,8 @@ class MockNAEUSB(NAEUSBIface):
         if cmd == USART.CMD_USART0_CONFIG: # used by the uart interface to determine the numwaiting of the target
             value = value & 0xFF
             if value == USART.USART_CMD_NUMWAIT:
-                return bytearray([self.mock_target_sim.in_waiting()])
+                # the count is returned as a single byte
+                return bytearray([min(self.mock_target_sim.in_waiting(), 0xFF)])
             elif value == USART.USART_CMD_NUMWAIT_TX:
                 return bytearray([0])
         elif cmd == USART.CMD_USART0_DATA:
@@ -916,6 +920,8 @@ class MockNAEUSB(NAEUSBIface):
             return bytearray([0xff, 0xff, 0xff, 0xff]) # all true
         elif cmd == self.CMD_FPGA_PROGRAM:
             target_logger.warn("FPGA programming not implemented")
+        elif cmd == REQ_NU51_ICP_PROGRAM:
+            return self.mock_icp.readCtrl(value, dlen)
         else:
             raise Exception("Not implemented!")
         return bytearray([0])
@@ -935,6 +941,9 @@ class MockNAEUSB(NAEUSBIface):
         elif cmd == USART.CMD_USART0_DATA:
             self.mock_target_sim.send_to_target(data)
             return
+        elif cmd == REQ_NU51_ICP_PROGRAM:
+            self.mock_icp.sendCtrl(value, data)
+            return
         return
 
 if __name__ == "__main__":
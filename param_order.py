@@ -0,0 +1,67 @@
+import itertools
+import time
+from typing import Optional
+import chipwhisperer as cw
+from glitch_params import GlitchControllerParams, STANDARD_PARAMS
+
+# The glitch controller iterates the parameters in `param_order` as nested loops, with the first parameter
+# as the outermost loop and the last parameter as the innermost (fastest changing) one.
+# Since only parameters that changed since the last setting are written to the scope, a parameter is written
+# (number of steps of it and every parameter outside of it) times; putting the expensive parameters on the outside
+# minimizes the total reconfiguration time.
+
+DEFAULT_MEASURE_REPEATS = 10
+
+
+def measure_param_write_costs(scope: cw.scopes.ScopeTypes, glitch_params: GlitchControllerParams, repeats: int = DEFAULT_MEASURE_REPEATS) -> dict[str, float]:
+    """
+    Measures the time (in seconds) it takes to write each glitch parameter to the scope.
+
+    If the scope provides a latency model (`glitch_write_latency`, e.g. the mock scope), that is used instead.
+    The original scope.glitch values are restored afterwards.
+    """
+    model: Optional[dict[str, float]] = getattr(scope, "glitch_write_latency", None)
+    if model:
+        return {param: model.get(param, 0.0) for param in STANDARD_PARAMS}
+    costs = {}
+    for param in STANDARD_PARAMS:
+        original = getattr(scope.glitch, param)
+        range_val = getattr(glitch_params, param + "_range")
+        # alternate between two values so that the scope can't skip the write
+        values = [range_val[0], range_val[1]] if isinstance(range_val, list) else [range_val, range_val]
+        start = time.perf_counter()
+        for i in range(repeats):
+            setattr(scope.glitch, param, values[i % 2])
+        costs[param] = (time.perf_counter() - start) / repeats
+        setattr(scope.glitch, param, original)
+    return costs
+
+
+def estimate_reconfig_seconds(glitch_params: GlitchControllerParams, order: list[str], costs: dict[str, float]) -> float:
+    """
+    Estimates the total time spent writing glitch parameters over the whole grid when iterating in `order`.
+    """
+    total = 0.0
+    writes = 1
+    for param in order:
+        steps = glitch_params.get_number_of_steps(param, False)
+        writes *= steps
+        # static parameters only get written once
+        total += (writes if steps > 1 else 1) * costs[param]
+    return total
+
+
+def find_optimal_param_order(glitch_params: GlitchControllerParams, costs: dict[str, float]) -> tuple[list[str], float]:
+    """
+    Returns the parameter order with the lowest estimated reconfiguration time, and that time.
+
+    The current order is kept if no other order is faster.
+    """
+    best_order = list(glitch_params.param_order)
+    best_time = estimate_reconfig_seconds(glitch_params, best_order, costs)
+    for order in itertools.permutations(STANDARD_PARAMS):
+        order_time = estimate_reconfig_seconds(glitch_params, list(order), costs)
+        if order_time < best_time:
+            best_order = list(order)
+            best_time = order_time
+    return best_order, best_time
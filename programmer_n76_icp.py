@@ -1,6 +1,12 @@
-from functools import wraps
+from contextlib import contextmanager
+from functools import wraps, lru_cache
+import hashlib
+import json
 import logging
+import os
+import random
 import subprocess
+import threading
 import time
 from chipwhisperer.capture.scopes import ScopeTypes
 from chipwhisperer.capture.api.programmers import save_and_restore_pins, Programmer
@@ -16,9 +22,13 @@ from pyparsing import C
 # Disables brown-out detector
 NO_BROWNOUT_CONFIG = bytes([0xFF, 0xFF, 0x73, 0xFF, 0xFF])
 
+# programmers of several devices can share a program cache file
+_program_cache_lock = threading.RLock()
+
 class N76E003:
     signature = N76E003_DEVID
     name = "N76E003"
+    flash_size = 18 * 1024
 
 supported_devices = [N76E003]
 
@@ -68,6 +78,10 @@ NUVO_GET_RAMBUF = 0xe4
 NUVO_SET_RAMBUF = 0xe5
 NUVO_GET_STATUS = 0xe6
 
+# Commands newaeUSBICPLib.batch() sends without reading their status back. Only idempotent setters, so a failed batch can be
+# replayed one command at a time to find the one that failed.
+BATCHABLE_CMDS = (NUVO_SET_PROG_TIME, NUVO_SET_PAGE_ERASE_TIME, NUVO_SET_MASS_ERASE_TIME)
+
 NUVO_ERR_OK = 0
 NUVO_ERR_FAILED = 1
 NUVO_ERR_INCORRECT_PARAMS = 2
@@ -78,7 +92,12 @@ NUVO_ERR_READ_FAILED = 6
 
 # page size
 NU51_PAGE_SIZE = 128
+# "checksum": the checksums the ICP firmware returned for each page written, "sample": the checksums and a read back of some pages, "full": a read back of the whole image
+VERIFY_MODES = ("checksum", "sample", "full")
 NU51_PAGE_MASK = 0xFF80
+# the config bytes are read and written at this address
+NU51_CONFIG_ADDR = 0x30000
+NU51_CONFIG_LEN = 5
 
 
 NUVO_PREFIX_LEN = 3
@@ -96,19 +115,71 @@ def unpackuint16(buf, offset=0):
     return pint
 
 
+class FirmwareImage:
+    """
+    A firmware image converted to a flat binary starting at `min_addr`, with the SHA-256 of its flash contents.
+    """
+    def __init__(self, data: bytes, min_addr: int = 0):
+        self.data = bytes(data)
+        self.min_addr = min_addr
+        # the image as it's laid out in flash from address 0, with the gap below min_addr left erased
+        self.flash_data = b"\xff" * min_addr + self.data
+        self.sha256 = hashlib.sha256(self.flash_data).hexdigest()
+
+    def __len__(self):
+        return len(self.data)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "FirmwareImage":
+        """
+        Converts an Intel HEX or raw binary file. Conversions are cached by path, modification time and size,
+        so programming the same unchanged file again doesn't reparse it.
+        """
+        st = os.stat(filename)
+        return cls._from_file(os.path.realpath(filename), st.st_mtime_ns, st.st_size)
+
+    @classmethod
+    @lru_cache(maxsize=16)
+    def _from_file(cls, path: str, mtime_ns: int, size: int) -> "FirmwareImage":
+        if path.endswith(".hex"):
+            # convert it to bin
+            f = IntelHex(path)
+            start = f.minaddr()
+            return cls(bytes(f.tobinarray(start=start)), start)
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+
 class newaeUSBICPLib(ICPLibInterface):
     REQ_NU51_ICP_PROGRAM = 0x40
     PREFIX_LEN = NUVO_PREFIX_LEN
     MAX_BUFFER_SIZE = 256
+    READ_CHUNK_SIZE = 64
+    # the ram buffer offset is sent in the high byte of wValue
+    MAX_RAMBUF_OFFSET = 0xFF
+    # (ram buffer size, control transfer size) pairs tried by negotiate_read_sizes(), largest first. The firmware's ram
+    # buffer is MAX_BUFFER_SIZE bytes, so only the control transfer size is negotiated; larger reads would overrun it.
+    READ_SIZE_CANDIDATES = [(MAX_BUFFER_SIZE, 256), (MAX_BUFFER_SIZE, 128), (MAX_BUFFER_SIZE, READ_CHUNK_SIZE)]
 
     def debug_print(self, *args):
         if scope_logger.getEffectiveLevel() <= logging.DEBUG:
             self.print_func(*args)
 
-    def __init__(self, scope: ScopeTypes, print_func=print):
+    def __init__(self, scope: ScopeTypes, print_func=print, fast_write=True, read_buffer_size=MAX_BUFFER_SIZE, read_chunk_size=READ_CHUNK_SIZE):
+        """
+        :param fast_write: Stream each page into the ram buffer without reading back the status of every chunk, and only validate the page checksum (default=True)
+        :param read_buffer_size: The number of bytes read_flash reads into the ram buffer per read command, at most MAX_BUFFER_SIZE (default=256)
+        :param read_chunk_size: The number of bytes read_flash drains from the ram buffer per control transfer (default=64)
+        """
         self.scope: ScopeTypes = scope
         self._usb: NAEUSB = scope._getNAEUSB()
         self.print_func = print_func
+        self.fast_write = fast_write
+        self.set_read_sizes(read_buffer_size, read_chunk_size)
+        # page address -> checksum returned by the last write to that page, cleared by erases
+        self._page_checksums = {}
+        # (cmd, data) of the batched setters whose status hasn't been checked yet, None outside batch()
+        self._batch = None
 
     def err_to_str(self, err):
         if err == NUVO_ERR_OK:
@@ -188,6 +259,13 @@ class newaeUSBICPLib(ICPLibInterface):
             data = bytearray()
         if not isinstance(data, bytearray):
             data = bytearray(data)
+        if self._batch is not None and checkStatus:
+            if cmd in BATCHABLE_CMDS:
+                self._usb.sendCtrl(self.REQ_NU51_ICP_PROGRAM, cmd, data)
+                self._batch.append((cmd, data))
+                return []
+            # the status read for this command would replace the status of the queued setters
+            self.sync()
         self._usb.sendCtrl(self.REQ_NU51_ICP_PROGRAM, cmd, data)
         # Check status
         status = []
@@ -197,6 +275,48 @@ class newaeUSBICPLib(ICPLibInterface):
                 raise IOError("Nu51 ICP Command %s (%x) failed: err=%s (%x), timeout=%d" % (self.cmd_to_str(cmd), cmd, self.err_to_str(status[1]), status[1], status[2]))
             self.debug_print("Nu51 ICP Command %s (%x) OK" % (self.cmd_to_str(cmd), cmd))
         return status[NUVO_PREFIX_LEN:]
+
+    @contextmanager
+    def batch(self):
+        """
+        Context in which the program/erase time setters (BATCHABLE_CMDS) are sent without reading back their status.
+        The status is read once at the next sync point: `entry()`, an explicit `sync()`, any other status-checked command,
+        or the end of the context.
+
+        The ICP firmware only keeps the status of the last command, so a failed sync replays the queued setters one by one
+        with status checks to name the one that failed. The setters are idempotent, so replaying them is safe. They only
+        fail on malformed parameters, which the setters always send as two uint32s.
+        """
+        if self._batch is not None:
+            # nested, the outer batch syncs
+            yield self
+            return
+        self._batch = []
+        try:
+            yield self
+            self.sync()
+        finally:
+            self._batch = None
+
+    def sync(self):
+        """
+        Checks the status of the setters queued in batch mode.
+        """
+        if not self._batch:
+            return
+        pending, self._batch = self._batch, None
+        try:
+            status = self._n51GetStatus()
+            if status[1] == NUVO_ERR_OK:
+                self.debug_print("Nu51 ICP batch of %d commands OK" % len(pending))
+                return
+            self.debug_print("Nu51 ICP batch of %d commands failed, replaying" % len(pending))
+            for cmd, data in pending:
+                self._n51DoCmd(cmd, data, checkStatus=True)
+            raise IOError("Nu51 ICP batch of %d commands failed: err=%s (%x), timeout=%d, but every command succeeded when replayed" % (len(pending), self.err_to_str(status[1]), status[1], status[2]))
+        finally:
+            self._batch = []
+
     def _n51DoRead(self, cmd, dlen):
         """
         Read the result of some command.
@@ -214,12 +334,12 @@ class newaeUSBICPLib(ICPLibInterface):
         Read the ram buffer
         """
         return self._n51DoRead(NUVO_GET_RAMBUF | (offset << 8), dlen=dlen)
-    def _n51SetRambuf(self, offset, data):
+    def _n51SetRambuf(self, offset, data, checkStatus=True):
         """
         Set the ram buffer.
         """
         # windex selects interface, set to 0
-        return self._n51DoCmd(NUVO_SET_RAMBUF | (offset << 8), data, checkStatus=True)
+        return self._n51DoCmd(NUVO_SET_RAMBUF | (offset << 8), data, checkStatus=checkStatus)
 
     def init(self) -> bool:
         self.scope.io.cwe.setAVRISPMode(1)
@@ -227,6 +347,8 @@ class newaeUSBICPLib(ICPLibInterface):
         return True
 
     def entry(self, do_reset=True) -> int:
+        # sync point for batched setters
+        self.sync()
         val = (1 if do_reset else 0)
         ret = unpackuint32(self._n51DoCmd(NUVO_CMD_ENTER_ICP_MODE, bytearray([val]), checkStatus=True, rlen=4))
         return ret
@@ -266,103 +388,122 @@ class newaeUSBICPLib(ICPLibInterface):
     def read_ucid(self) -> bytes:
         return self._n51DoCmd(NUVO_CMD_GET_UCID, bytearray(), checkStatus=True, rlen=16)
 
-    def read_flash(self, addr, length) -> bytes:
-        memread = 0
-        endptsize = 64
-        dlen = length
-
-        membuf = []
-
-        while memread < dlen:
-
-            # Read into internal buffer
-            ramreadln = dlen - memread
-
-            # Check if maximum size for internal buffer
-            if ramreadln > self.MAX_BUFFER_SIZE:
-                ramreadln = self.MAX_BUFFER_SIZE
+    def set_read_sizes(self, buffer_size, chunk_size):
+        if buffer_size <= 0 or chunk_size <= 0:
+            raise ValueError("Read sizes must be positive")
+        if buffer_size > self.MAX_BUFFER_SIZE:
+            raise ValueError("The firmware's ram buffer is only {} bytes".format(self.MAX_BUFFER_SIZE))
+        if (buffer_size - 1) // chunk_size * chunk_size > self.MAX_RAMBUF_OFFSET:
+            raise ValueError("A {} byte ram buffer can't be drained in {} byte chunks, the offset wouldn't fit in a byte".format(buffer_size, chunk_size))
+        self.read_buffer_size = buffer_size
+        self.read_chunk_size = chunk_size
+
+    def negotiate_read_sizes(self, addr=0) -> tuple[int, int]:
+        """
+        Picks the largest of READ_SIZE_CANDIDATES that the firmware handles, by checking reads at `addr` with each
+        against a read with the default sizes. Only called on request, reads use the default sizes otherwise.
+        Returns (ram buffer size, control transfer size).
+        """
+        self.set_read_sizes(self.MAX_BUFFER_SIZE, self.READ_CHUNK_SIZE)
+        length = max(buffer_size for buffer_size, _ in self.READ_SIZE_CANDIDATES)
+        reference = self.read_flash(addr, length)
+        for buffer_size, chunk_size in self.READ_SIZE_CANDIDATES:
+            self.set_read_sizes(buffer_size, chunk_size)
+            try:
+                if self.read_flash(addr, length) == reference:
+                    break
+            except Exception as e:
+                self.debug_print("Reading with a {} byte buffer in {} byte transfers failed: {}".format(buffer_size, chunk_size, e))
+            self.set_read_sizes(self.MAX_BUFFER_SIZE, self.READ_CHUNK_SIZE)
+        self.debug_print("Using a {} byte buffer and {} byte transfers to read".format(self.read_buffer_size, self.read_chunk_size))
+        return self.read_buffer_size, self.read_chunk_size
 
+    def read_flash(self, addr, length) -> bytes:
+        # The firmware has a single ram buffer, so the next read command can't be issued before this one is drained;
+        # the number of round trips is cut by draining it in as few control transfers as possible instead.
+        membuf = bytearray()
+        start_time = time.time()
+        for memread in range(0, length, self.read_buffer_size):
+            ramreadln = min(self.read_buffer_size, length - memread)
             self._n51DoCmd(NUVO_CMD_READ_FLASH, packuint32(addr + memread) + packuint16(ramreadln), checkStatus=True)
+            for epread in range(0, ramreadln, self.read_chunk_size):
+                membuf.extend(self._n51GetRambuf(epread, dlen=min(self.read_chunk_size, ramreadln - epread)))
+        elapsed = time.time() - start_time
+        if length > NU51_PAGE_SIZE and elapsed > 0:
+            self.debug_print("Read {:d} bytes in {:.2f}s ({:.1f} KB/s)".format(length, elapsed, length / elapsed / 1024))
+        return bytes(membuf)
 
-            epread = 0
-
-            # First we need to fill the page buffer in the USB Interface using smaller transactions
-            while epread < ramreadln:
-
-                epreadln = ramreadln - epread
-                if epreadln > endptsize:
-                    epreadln = endptsize
+    def _write_page(self, addr, page, check_chunks=True):
+        """
+        Fill the ram buffer with one page (or less) of data and write it to flash.
 
-                # Read data out progressively
-                membuf.extend(self._n51GetRambuf(epread, dlen=epreadln))
-                # print epread
-                epread += epreadln
-            memread += ramreadln
-        return bytes(membuf)
+        :param check_chunks: Read back the status after every ram buffer chunk; otherwise errors show up as a checksum mismatch
+        """
+        endptsize = 64
+        tx_checksum = sum(page) & 0xffff
+        for offset in range(0, len(page), endptsize):
+            self._n51SetRambuf(offset, data=page[offset:offset + endptsize], checkStatus=check_chunks)
+        infoblock = packuint32(addr) + packuint16(len(page))
+        rx_checksum = unpackuint16(self._n51DoCmd(NUVO_CMD_WRITE_FLASH, data=infoblock, checkStatus=True, rlen=2))
+        if rx_checksum != tx_checksum:
+            raise IOError("Checksum error writing to address 0x{:04x}".format(addr))
+        self._page_checksums[addr] = rx_checksum
 
     def write_flash(self, addr, data) -> int:
-        memwritten = 0
-        endptsize = 64
-        start = 0
-        end = endptsize
         pagesize = NU51_PAGE_SIZE
         self.debug_print("Writing to address 0x{:04x}".format(addr))
         if addr % pagesize:
             self.print_func('You appear to be writing to an address that is not page aligned, you will probably write the wrong data')
-        if len(data) < pagesize:
-            pagesize = len(data)
-
-        while memwritten < len(data):
-
-            epwritten = 0
-            tx_checksum = 0
-
-            # First we need to fill the page buffer in the USB Interface using smaller transactions
-            while epwritten < pagesize:
-
-                # Check for less than full endpoint written
-                if end > len(data):
-                    end = len(data)
-
-                # Get slice of data
-                epdata = data[start:end]
-                for byte in epdata:
-                    tx_checksum+=byte
-                tx_checksum &= 0xffff
-
-                self.debug_print("%d %d %d" % (epwritten, len(epdata), memwritten))
-                # Copy to USB interface buffer
-                self._n51SetRambuf(epwritten, data=epdata)
-
-                epwritten += len(epdata)
-
-                # Check for final write indicating we are done
-                if end == len(data):
-                    break
-
-                start += endptsize
-                end += endptsize
-            # Do write into memory type
-            infoblock = []
-
+        start_time = time.time()
+        for memwritten in range(0, len(data), pagesize):
+            self.debug_print("0x{:04x} {:d}".format(addr + memwritten, min(pagesize, len(data) - memwritten)))
+            self._write_page(addr + memwritten, data[memwritten:memwritten + pagesize], check_chunks=not self.fast_write)
+        elapsed = time.time() - start_time
+        if len(data) > pagesize and elapsed > 0:
+            self.print_func("Wrote {:d} bytes in {:.2f}s ({:.1f} KB/s)".format(len(data), elapsed, len(data) / elapsed / 1024))
+        return True
 
-            infoblock.extend(packuint32(addr + memwritten))
-            infoblock.extend(packuint16(epwritten))
+    def verify_flash(self, addr, data, mode="checksum", sample_pages=8) -> bool:
+        """
+        Verifies that `data` was written at `addr`.
 
-            # print "%x" % (addr + memwritten)
-            # print epwritten
-            rx_checksum = unpackuint16(self._n51DoCmd(NUVO_CMD_WRITE_FLASH, data=infoblock, checkStatus=True, rlen=2))
-            if rx_checksum != tx_checksum:
-                raise IOError("Checksum error writing to address 0x{:04x}".format(addr + memwritten))
-            memwritten += epwritten
+        :param mode: One of VERIFY_MODES. "checksum" only checks that every page was written with `write_flash` since the
+            last erase and that the firmware's checksum of it matched (this checks the data the firmware received, not the flash
+            cells). "sample" also reads back the first, last and `sample_pages` random pages. "full" reads back everything.
+        """
+        if mode not in VERIFY_MODES:
+            raise ValueError("Unknown verify mode {}, must be one of {}".format(mode, VERIFY_MODES))
+        start_time = time.time()
+        if mode == "full":
+            if bytes(self.read_flash(addr, len(data))) != bytes(data):
+                self.print_func("Verify failed: flash at 0x{:04x} doesn't match".format(addr))
+                return False
+            self.debug_print("Verified {:d} bytes in {:.2f}s".format(len(data), time.time() - start_time))
+            return True
+        offsets = list(range(0, len(data), NU51_PAGE_SIZE))
+        for offset in offsets:
+            page = data[offset:offset + NU51_PAGE_SIZE]
+            if self._page_checksums.get(addr + offset) != sum(page) & 0xffff:
+                self.print_func("Verify failed: no matching write checksum for 0x{:04x}".format(addr + offset))
+                return False
+        if mode == "sample" and offsets:
+            sampled = {offsets[0], offsets[-1]} | set(random.sample(offsets, min(sample_pages, len(offsets))))
+            for offset in sorted(sampled):
+                page = bytes(data[offset:offset + NU51_PAGE_SIZE])
+                if bytes(self.read_flash(addr + offset, len(page))) != page:
+                    self.print_func("Verify failed: flash at 0x{:04x} doesn't match".format(addr + offset))
+                    return False
+        self.debug_print("Verified {:d} bytes ({}) in {:.2f}s".format(len(data), mode, time.time() - start_time))
         return True
 
     def mass_erase(self) -> bool:
         self._n51DoCmd(NUVO_CMD_MASS_ERASE, bytearray(), checkStatus=True)
+        self._page_checksums.clear()
         return True
 
     def page_erase(self, addr) -> bool:
         self._n51DoCmd(NUVO_CMD_PAGE_ERASE, packuint32(addr), checkStatus=True)
+        self._page_checksums.pop(addr & NU51_PAGE_MASK, None)
         return True
     
     def set_program_time(self, delay_us: int, hold_us: int) -> bool:
@@ -376,15 +517,50 @@ class newaeUSBICPLib(ICPLibInterface):
     def set_mass_erase_time(self, delay_us: int, hold_us: int) -> bool:
         self._n51DoCmd(NUVO_SET_MASS_ERASE_TIME, packuint32(delay_us) + packuint32(hold_us),  checkStatus=True)
         return True
+
+    def set_timings(self, program: tuple[int, int], page_erase: tuple[int, int], mass_erase: tuple[int, int]) -> bool:
+        """
+        Sets the (delay_us, hold_us) of programming, page erase and mass erase with a single status read.
+        """
+        with self.batch():
+            self.set_program_time(*program)
+            self.set_page_erase_time(*page_erase)
+            self.set_mass_erase_time(*mass_erase)
+        return True
     
 
         
 
 
 class N76ICPProgrammer(Programmer):
-    def __init__(self, logfunc=print, config_bytes: bytes = NO_BROWNOUT_CONFIG, scope = None):
+    def __init__(self, logfunc=print, config_bytes: bytes = NO_BROWNOUT_CONFIG, scope = None, fast_write = True, differential = False,
+                 program_cache: str = None, program_cache_samples = 4, verify_mode = "full", verify_sample_pages = 8,
+                 read_chunk_size = newaeUSBICPLib.READ_CHUNK_SIZE, negotiate_read_sizes = False):
+        """
+        :param differential: Only erase and rewrite the APROM pages (and config bytes) that differ from the image; `erase()` is deferred to `program()` (default=False)
+        :param program_cache: Path of a JSON record of the image and config bytes last flashed to each device (by UID/UCID). Programming is skipped when the record matches and is confirmed on the target; `erase()` is deferred to `program()` (default=None)
+        :param program_cache_samples: The number of random image pages read back to confirm the record, on top of the first and last pages (default=4)
+        :param verify_mode: How APROM writes are verified when `program()` is called with verify=True, one of VERIFY_MODES (default="full")
+        :param verify_sample_pages: The number of random pages read back by the "sample" verify mode (default=8)
+        :param read_chunk_size: The number of bytes flash reads drain from the ram buffer per control transfer (default=64)
+        :param negotiate_read_sizes: Pick the largest read transfer size the scope handles with `newaeUSBICPLib.negotiate_read_sizes()` the first time `program()` enters ICP mode, instead of using `read_chunk_size` (default=False)
+        """
+        if verify_mode not in VERIFY_MODES:
+            raise ValueError("Unknown verify mode {}, must be one of {}".format(verify_mode, VERIFY_MODES))
         self.logfunc = logfunc
-        self._erased = False
+        self.fast_write = fast_write
+        self.differential = differential
+        self.program_cache = program_cache
+        self.program_cache_samples = program_cache_samples
+        self.verify_mode = verify_mode
+        self.verify_sample_pages = verify_sample_pages
+        self.read_chunk_size = read_chunk_size
+        self.negotiate_read_sizes = negotiate_read_sizes
+        # UID of the device last programmed
+        self.last_uid = None
+        # whether the last program() verified its writes: None if it didn't get to verify them
+        self.last_verify = None
+        self.erased = False
         if config_bytes is None:
             config_bytes = NO_BROWNOUT_CONFIG
         self.config_bytes = config_bytes
@@ -392,7 +568,8 @@ class N76ICPProgrammer(Programmer):
         self.scope = scope
 
     def open(self):
-        self.lib = newaeUSBICPLib(self.scope, print_func=self.logfunc)
+        self.lib = newaeUSBICPLib(self.scope, print_func=self.logfunc, fast_write=self.fast_write, read_chunk_size=self.read_chunk_size)
+        self._read_sizes_negotiated = False
 
     def save_pin_setup(self):
         self.pin_setup['pdic'] = self.scope.io.pdic
@@ -418,25 +595,126 @@ class N76ICPProgrammer(Programmer):
     
     @staticmethod
     def convert_to_bin(filename:str):
-        if filename.endswith(".hex"):
-            # convert it to bin
-            f = IntelHex(filename)
-            start=f.minaddr()
-            fw_data = f.tobinarray(start=start)
-            return bytes(fw_data)
-        return open(filename, "rb").read()
+        return FirmwareImage.from_file(filename).data
+
+    def _program_differential(self, nuvo: Nuvo51ICP, file_data: bytes, config: ConfigFlags, device_info, verify=True) -> bool:
+        """
+        Erases and rewrites only the APROM pages that differ from `file_data` (padded with 0xFF up to the end of the APROM),
+        and the config bytes if they changed.
+        Returns False without touching the device if a full program is needed (locked device or LDROM layout change).
+        """
+        current_config = nuvo.read_config()
+        if current_config.is_locked():
+            self.logfunc("Device is locked, falling back to a full erase and program")
+            return False
+        if current_config.is_ldrom_boot() != config.is_ldrom_boot() or current_config.get_ldrom_size() != config.get_ldrom_size():
+            self.logfunc("LDROM configuration changed, falling back to a full erase and program")
+            return False
+        aprom_size = getattr(device_info, "flash_size", N76E003.flash_size) - config.get_ldrom_size()
+        if len(file_data) > aprom_size:
+            raise Exception("Image is too large for the APROM (>{}). Please check your setup.".format(aprom_size))
+        start_time = time.time()
+        image = bytes(file_data) + b"\xff" * (aprom_size - len(file_data))
+        current = self.lib.read_flash(0, aprom_size)
+        changed = [addr for addr in range(0, aprom_size, NU51_PAGE_SIZE) if current[addr:addr + NU51_PAGE_SIZE] != image[addr:addr + NU51_PAGE_SIZE]]
+        written = []
+        for addr in changed:
+            page = image[addr:addr + NU51_PAGE_SIZE]
+            self.lib.page_erase(addr)
+            if page.count(0xFF) != len(page):
+                self.lib.write_flash(addr, page)
+                written.append(addr)
+        if verify:
+            # "sample" reads back a sample of the rewritten pages rather than of every one
+            page_mode = "checksum" if self.verify_mode == "sample" else self.verify_mode
+            read_back = random.sample(written, min(self.verify_sample_pages, len(written))) if self.verify_mode == "sample" else []
+            for addr in changed:
+                page = image[addr:addr + NU51_PAGE_SIZE]
+                if addr not in written:
+                    # erased but not written, so there's no write checksum to check; read it back in every mode
+                    ok = bytes(self.lib.read_flash(addr, len(page))) == page
+                else:
+                    ok = self.lib.verify_flash(addr, page, page_mode) and (addr not in read_back or self.lib.verify_flash(addr, page, "full"))
+                if not ok:
+                    self.last_verify = False
+                    raise IOError("Verify failed at address 0x{:04x}".format(addr))
+            self.last_verify = True
+        config_changed = current_config.to_bytes() != config.to_bytes()
+        if config_changed and not nuvo.program_config(config, erase=True):
+            raise IOError("Failed to program the config bytes")
+        self.logfunc("Rewrote {:d}/{:d} pages{} in {:.2f}s".format(len(changed), aprom_size // NU51_PAGE_SIZE,
+                                                                  " and the config bytes" if config_changed else "", time.time() - start_time))
+        return True
+
+    def _device_key(self) -> str:
+        return bytes(self.lib.read_uid()).hex() + "-" + bytes(self.lib.read_ucid()).hex()
+
+    def _load_program_cache(self) -> dict:
+        with _program_cache_lock:
+            if not os.path.exists(self.program_cache):
+                return {}
+            with open(self.program_cache, "r") as f:
+                return json.load(f)
+
+    def _is_already_programmed(self, nuvo: Nuvo51ICP, device_key: str, image: FirmwareImage, config: ConfigFlags) -> bool:
+        """
+        Checks the program cache record of the device against the image and config bytes, then confirms it on the target
+        by reading the config bytes and a sample of the image's pages.
+        """
+        record = self._load_program_cache().get(device_key)
+        if not record or record["image_sha256"] != image.sha256 or record["config"] != config.to_bytes().hex():
+            return False
+        if nuvo.read_config().to_bytes() != config.to_bytes():
+            self.logfunc("Config bytes differ from the program cache record")
+            return False
+        pages = list(range(image.min_addr & NU51_PAGE_MASK, len(image.flash_data), NU51_PAGE_SIZE))
+        if not pages:
+            # nothing on the target to confirm the record with
+            return False
+        sampled = {pages[0], pages[-1]} | set(random.sample(pages, min(self.program_cache_samples, len(pages))))
+        for addr in sorted(sampled):
+            page = image.flash_data[addr:addr + NU51_PAGE_SIZE]
+            if bytes(self.lib.read_flash(addr, len(page))) != page:
+                self.logfunc("Flash at 0x{:04x} differs from the program cache record".format(addr))
+                return False
+        return True
+
+    def _record_programmed(self, device_key: str, image: FirmwareImage, config: ConfigFlags):
+        with _program_cache_lock:
+            cache = self._load_program_cache()
+            cache[device_key] = {"image_sha256": image.sha256, "config": config.to_bytes().hex(),
+                                 "size": len(image), "file": self.lastFlashedFile, "time": time.time()}
+            cache_dir = os.path.dirname(self.program_cache)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            # write to a temp file and rename, so other processes never read a half-written cache
+            tmp_path = self.program_cache + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(cache, f, indent=4)
+            os.replace(tmp_path, self.program_cache)
 
     @save_and_restore_pins
     def program(self, filename:str, memtype="flash", verify=True):
         self.lastFlashedFile = filename
-        file_data = self.convert_to_bin(filename)
+        image = FirmwareImage.from_file(filename)
+        # the LDROM is placed by the config bytes rather than by its link address
+        file_data = image.data if memtype == "ldrom" else image.flash_data
         programmed = False
+        self.last_verify = None
         should_erase = not self.erased
         self.erased = False
         config: ConfigFlags = None
         with Nuvo51ICP(library=self.lib, logfunc=self.logfunc, _deinit_reset_high=False) as nuvo:
             device_info = nuvo.get_device_info()
+            if self.negotiate_read_sizes and not self._read_sizes_negotiated:
+                self.lib.negotiate_read_sizes()
+                self._read_sizes_negotiated = True
             config = ConfigFlags.from_bytes(self.config_bytes, device_info.device_id)
+            self.last_uid = bytes(self.lib.read_uid()).hex()
+            device_key = self._device_key() if self.program_cache and memtype != "ldrom" else None
+            if device_key and self._is_already_programmed(nuvo, device_key, image, config):
+                self.logfunc("Device {} already holds this image and config, skipping programming".format(device_key))
+                return
             if memtype == "ldrom":
                 if len(file_data) > device_info.ldrom_max_size:
                     raise Exception("LDROM size is too large for the device (>{}). Please check your setup.".format(device_info.ldrom_max_size))
@@ -447,14 +725,23 @@ class N76ICPProgrammer(Programmer):
                     config.set_ldrom_size(len(file_data))
                     self.logfunc("Overriding LDROM size setting to {}".format(len(file_data)))
                 programmed = nuvo.program_ldrom(file_data, config, verify=verify, erase=should_erase)
+                if programmed and verify:
+                    self.last_verify = True
                 # check config
                 if programmed:
                     programmed = nuvo.program_config(config, erase = (should_erase))
+            elif self.differential and self._program_differential(nuvo, file_data, config, device_info, verify=verify):
+                programmed = True
             else:
-                programmed = nuvo.program_aprom(file_data, config=config, verify=verify, erase=should_erase)
+                # verify separately from nuvo, so a verify failure can be told apart from a failed write
+                programmed = nuvo.program_aprom(file_data, config=config, verify=False, erase=should_erase)
+                if programmed and verify:
+                    self.last_verify = programmed = self.lib.verify_flash(0, file_data, self.verify_mode, self.verify_sample_pages)
                 programmed = programmed and nuvo.program_config(config, erase = (should_erase))
         if not programmed:
             raise Exception("Failed to flash image. Please check your setup.")
+        if device_key:
+            self._record_programmed(device_key, image, config)
         self.logfunc("Resulting device configuration:")
         self.logfunc(config.get_config_status())
         self.logfunc("Programming successful!")
@@ -463,6 +750,9 @@ class N76ICPProgrammer(Programmer):
 
     @save_and_restore_pins
     def erase(self):
+        if self.differential or self.program_cache:
+            # program() erases what it needs to
+            return
         with Nuvo51ICP(library=self.lib, logfunc=self.logfunc, _deinit_reset_high=False) as nuvo:
             self.erased = nuvo.mass_erase()
         if not self.erased:
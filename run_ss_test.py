@@ -21,6 +21,7 @@ from mocks.mock_scope import MockOpenADC
 from ss_glitch_loop_test import SSGlitchLoopTest, SSVersionTest
 from TestSetup import TestOptions, TestSetupTemplate
 from programmer_n76_icp import N76ICPProgrammer
+from trace_align import align_traces
 
 # Default is 16mhz, max for both compiled and max is 16.6mhz; it's not stable at higher frequencies
 # Compiled clock rate = what the firmware uses when calculating the baud rates
@@ -260,6 +261,7 @@ def reconnect(run_setup = True):
 
 from glitch_params import GlitchControllerParams
 from nuvoprogpy.nuvo51icpy import Nuvo51ICP, ConfigFlags
+from ext_offset_discovery import discover_ext_offset_range
 
 def device_reset():
 	scope.io.nrst = 'low'
@@ -330,9 +332,35 @@ def capture_run(fw_dir: str = "", name = "", options: TestOptions = None):
 		test.fw_image_path = make_image(fw_dir)
 
 	data = test.capture_sequence(500, name)
-	mean_data = np.mean(data, axis = 0)
+	if test.online_trace_stats:
+		# only the running stats are kept, no traces
+		mean_data = data["normal"].mean if "normal" in data else None
+	elif not USE_EXTERNAL_CLOCK and data is not None and len(data) > 1:
+		# the internal RC oscillator drifts, align the traces before averaging
+		mean_data, shifts = align_traces(data)
+		print("Trace shifts: min = %d, max = %d" % (shifts.min(), shifts.max()))
+	else:
+		mean_data = np.mean(data, axis = 0)
 	return data, mean_data
 
+def ext_offset_discovery_run(base_params: GlitchControllerParams, fw_dir: str = "", name = "", options: TestOptions = None, output_path: Optional[str] = None):
+	"""
+	Capturing traces of the glitch loop to propose an ext_offset range
+	"""
+	reconnect()
+	time.sleep(1)
+	test = SSGlitchLoopTest(scope, target, prog, base_params, options)
+	if MOCK:
+		print("**** MOCK TEST ****")
+		print("Skipping flashing....")
+		name = "mock_" + name
+	if fw_dir == "":
+		print("Skipping ROM flashing...")
+	else:
+		print("*** Building ROM: %s" % fw_dir)
+		test.fw_image_path = make_image(fw_dir)
+	return discover_ext_offset_range(test, name=name, output_path=output_path)
+
 def glitch_run(name, 
 			   test_type: type[TestSetupTemplate], 
 			   width_range,
@@ -557,9 +585,11 @@ def test_get_rctrim_values():
 	print("rctrimVals38_39 (24mhz): ", rctrimVals38_39)
 	target.simpleserial_write('b', bytearray()) # blink forever
 
-run_ss_glitch_loop_test()
-# run_ss_version_test("simpleserial-n76-test", "simpleserial-n76-test")
-# test_get_rctrim_values()
+# align_traces() starts worker processes, which import this module again
+if __name__ == "__main__":
+	run_ss_glitch_loop_test()
+	# run_ss_version_test("simpleserial-n76-test", "simpleserial-n76-test")
+	# test_get_rctrim_values()
 # test_scope()
 # gc.display_stats()
 # print(get_base_fw_dir())
\ No newline at end of file
@@ -0,0 +1,128 @@
+import math
+from statistics import NormalDist
+from typing import Optional
+
+
+def z_score(confidence: float, one_sided: bool = False) -> float:
+    """
+    Returns the two-sided (or one-sided) z score for the given confidence level (e.g. 0.95 -> 1.96, or 1.645 one-sided).
+    """
+    return NormalDist().inv_cdf(confidence if one_sided else 0.5 + confidence / 2)
+
+
+def required_sample_size(confidence: float, margin: float, population: Optional[int] = None, expected_rate: float = 0.5) -> int:
+    """
+    Returns the number of attempts needed to estimate a rate to within +/- `margin` at the given confidence level.
+
+    Args:
+      - confidence (`float`): The confidence level (e.g. 0.95).
+      - margin (`float`): The desired half-width of the confidence interval.
+      - population (`Optional[int]`) [default = `None`]: The total number of attempts available; applies the finite population correction.
+      - expected_rate (`float`) [default = `0.5`]: The anticipated rate; 0.5 is the worst case.
+    """
+    z = z_score(confidence)
+    n = (z ** 2) * expected_rate * (1 - expected_rate) / (margin ** 2)
+    if population:
+        n = n / (1 + (n - 1) / population)
+        return min(population, math.ceil(n))
+    return math.ceil(n)
+
+
+def wilson_interval(count: float, total: int, confidence: float, one_sided: bool = False) -> tuple[float, float]:
+    """
+    Returns the Wilson score interval (low, high) for `count` events out of `total` attempts.
+    With `one_sided`, each bound holds at `confidence` on its own, for testing a rate against either of them.
+    """
+    if total == 0:
+        return 0.0, 1.0
+    z = z_score(confidence, one_sided)
+    rate = count / total
+    denominator = 1 + z ** 2 / total
+    center = (rate + z ** 2 / (2 * total)) / denominator
+    half_width = (z / denominator) * math.sqrt(rate * (1 - rate) / total + z ** 2 / (4 * total ** 2))
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def required_sample_size_for_bound(confidence: float, max_rate: float, expected_rate: float = 0.0, population: Optional[int] = None) -> int:
+    """
+    Returns the number of attempts needed for the one-sided Wilson upper bound to fall to `max_rate` when events occur
+    at `expected_rate`, i.e. the smallest sample that can show a rate is below `max_rate`.
+
+    Args:
+      - confidence (`float`): The confidence level of the bound (e.g. 0.95).
+      - max_rate (`float`): The rate the upper bound has to fall to.
+      - expected_rate (`float`) [default = `0.0`]: The anticipated rate; must be below `max_rate`.
+      - population (`Optional[int]`) [default = `None`]: The total number of attempts available; caps the result.
+    """
+    if not 0 <= expected_rate < max_rate:
+        raise ValueError("The expected rate must be at least 0 and below the maximum rate")
+    def upper(total):
+        return wilson_interval(expected_rate * total, total, confidence, one_sided=True)[1]
+    # the bound shrinks as the sample grows; find a large enough sample, then the smallest one
+    high = 1
+    while upper(high) > max_rate:
+        high *= 2
+    low = high // 2
+    while high - low > 1:
+        mid = (low + high) // 2
+        if upper(mid) > max_rate:
+            low = mid
+        else:
+            high = mid
+    return min(population, high) if population else high
+
+
+class EtaEstimator:
+    """
+    Estimates the remaining run time from exponentially weighted moving averages of the time per try for each outcome
+    (e.g. "normal", "reset", "skipped") and of the reset rate. Each update is O(1).
+    """
+    def __init__(self, alpha: float = 0.02):
+        self.alpha = alpha
+        self._seconds_per_try: dict[str, float] = {}
+        self._reset_rate: Optional[float] = None
+
+    def _ewma(self, old: Optional[float], new: float, count: int) -> float:
+        if old is None:
+            return new
+        # equivalent to `count` single updates with the same value
+        weight = 1 - (1 - self.alpha) ** count
+        return old + weight * (new - old)
+
+    def add(self, outcome: str, seconds: float, count: int = 1):
+        """
+        Records `count` tries with the given outcome that took `seconds` in total.
+        """
+        if count <= 0:
+            return
+        self._seconds_per_try[outcome] = self._ewma(self._seconds_per_try.get(outcome), seconds / count, count)
+        if outcome != "skipped":
+            self._reset_rate = self._ewma(self._reset_rate, 1.0 if outcome == "reset" else 0.0, count)
+
+    def seconds_per_try(self, outcome: str) -> Optional[float]:
+        return self._seconds_per_try.get(outcome)
+
+    @property
+    def reset_rate(self) -> float:
+        return self._reset_rate or 0.0
+
+    def seconds_per_attempt(self) -> Optional[float]:
+        """
+        Returns the expected time of a (non-skipped) try, weighted by the current reset rate.
+        """
+        normal = self._seconds_per_try.get("normal")
+        reset = self._seconds_per_try.get("reset")
+        if normal is None and reset is None:
+            return None
+        if normal is None or reset is None:
+            return normal if reset is None else reset
+        return (1 - self.reset_rate) * normal + self.reset_rate * reset
+
+    def estimate(self, remaining_attempts: int, remaining_skipped: int = 0, break_seconds: float = 0.0) -> Optional[float]:
+        """
+        Returns the estimated remaining time in seconds, or None if nothing has been measured yet.
+        """
+        per_attempt = self.seconds_per_attempt()
+        if per_attempt is None:
+            return None
+        return remaining_attempts * per_attempt + remaining_skipped * self._seconds_per_try.get("skipped", 0.0) + break_seconds
@@ -3,13 +3,20 @@ from chipwhisperer.capture.targets import TargetTypes, SimpleSerial, SimpleSeria
 from chipwhisperer.capture.api.programmers import Programmer
 import chipwhisperer as cw
 from TestSetup import TestSetupTemplate, TestResult, TestOptions
-from typing import Optional
+from typing import Optional, Union
 import time
+import numpy as np
 from chipwhisperer.common.utils.util import CWByteArray
 NORMAL_I_VAL = 50
 NORMAL_J_VAL = 50
 NORMAL_CNT_VAL = NORMAL_I_VAL * NORMAL_J_VAL
 BYTES_READ = 4
+# Burst glitch loop: 'b' with the number of attempts as the payload, returns BYTES_READ bytes per attempt
+BURST_CMD = 'b'
+# SimpleSerial2 payloads are at most 255 bytes
+MAX_BURST_SIZE = 255 // BYTES_READ
+# extra read timeout per additional attempt in a burst
+BURST_TIMEOUT_MS_PER_ATTEMPT = 10
 
 class SSGlitchLoopTest(TestSetupTemplate):
 	def __init__(self, _scope: cw.scopes.OpenADC, target: SimpleSerial2, programmer: Optional[type[Programmer]], glitch_controller_params, options: TestOptions = None):
@@ -20,6 +27,8 @@ class SSGlitchLoopTest(TestSetupTemplate):
 		return data[0] + (data[1] << 8) + (data[2] << 16) + (data[3] << 24)
 	
 	def prep_run(self) -> bool:
+			if self.burst_size > MAX_BURST_SIZE:
+				raise ValueError("burst_size must be <= %d for %s" % (MAX_BURST_SIZE, self.name))
 			retries = 10
 			while(True):
 				if not self.iter_run():
@@ -44,7 +53,10 @@ class SSGlitchLoopTest(TestSetupTemplate):
 	def iter_run(self) -> bool:
 			if self.logger_level <= TestOptions.LOG_TRACE:
 					start_time = time.time()
-			self.target.simpleserial_write('g', bytearray([]))
+			if self._current_burst_size > 1:
+				self.target.simpleserial_write(BURST_CMD, bytearray([self._current_burst_size]))
+			else:
+				self.target.simpleserial_write('g', bytearray([]))
 			if self.logger_level <= TestOptions.LOG_TRACE:
 					end_time = time.time()
 					self.logger.debug("Write time: %f" % (end_time - start_time))
@@ -52,12 +64,31 @@ class SSGlitchLoopTest(TestSetupTemplate):
 	def get_data(self) -> Optional[CWByteArray]:
 		if self.logger_level <= TestOptions.LOG_TRACE:
 			start_time = time.time()
-		read = self.target.simpleserial_read('r', BYTES_READ)
+		if self._current_burst_size > 1:
+			timeout = 250 + BURST_TIMEOUT_MS_PER_ATTEMPT * (self._current_burst_size - 1)
+			read = self.target.simpleserial_read('r', BYTES_READ * self._current_burst_size, timeout=timeout)
+		else:
+			read = self.target.simpleserial_read('r', BYTES_READ)
 		if self.logger_level <= TestOptions.LOG_TRACE:
 			end_time = time.time()
 			self.logger.debug("read time: %f" % (end_time - start_time))
 		return read
-	def check_result(self, data: CWByteArray) -> TestResult:
+	def check_burst_result(self, data: CWByteArray) -> list[TestResult]:
+			if not data or len(data) != BYTES_READ * self._current_burst_size:
+				# The target only answers once the whole burst is done, so we can't tell which attempt reset
+				self.logger.debug("Burst data length is not %d: %s" % (BYTES_READ * self._current_burst_size, str(len(data)) if data else "None"))
+				return [TestResult.reset]
+			gcnt_vals = np.frombuffer(bytes(data), dtype='<u4')
+			success = gcnt_vals != NORMAL_CNT_VAL
+			if success.any():
+				if not self._printed_success_warning:
+					self.logger.warning("SUCCESS: On Success, device will return an error 0x10. This is expected behavior.")
+					self._printed_success_warning = True
+				self.logger.info("SUCCESS: Count values: %s" % str(gcnt_vals[success].tolist()))
+			return np.where(success, TestResult.success, TestResult.normal).tolist()
+	def check_result(self, data: CWByteArray) -> Union[TestResult, list[TestResult]]:
+			if self._current_burst_size > 1:
+				return self.check_burst_result(data)
 			if not data or len(data) != BYTES_READ:
 					if not data:
 						self.logger.debug("Data is none")
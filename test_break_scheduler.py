@@ -0,0 +1,83 @@
+from break_scheduler import AdaptiveBreakScheduler
+
+
+def no_sleep(seconds):
+    pass
+
+
+def locked():
+    return True
+
+
+def make_scheduler() -> AdaptiveBreakScheduler:
+    scheduler = AdaptiveBreakScheduler(window=10, reset_rate_margin=0.1, latency_drift=1.5, min_break_seconds=1, max_break_seconds=8)
+    # baseline: no resets, 10ms per attempt
+    scheduler.record(False, 0.01, count=10)
+    return scheduler
+
+
+def test_no_break_at_baseline():
+    scheduler = make_scheduler()
+    assert scheduler.degraded_reason() is None
+    assert scheduler.break_seconds() == 0
+    scheduler.record(False, 0.01, count=50)
+    assert scheduler.break_seconds() == 0
+
+
+def test_degradation_and_recovery():
+    scheduler = make_scheduler()
+    for _ in range(5):
+        scheduler.record(True)
+    assert scheduler.degraded_reason().startswith("reset rate")
+    assert scheduler.break_seconds() == 1
+    scheduler.take_break(scheduler.break_seconds(), locked, sleep=no_sleep)
+    # nothing to judge the break on until a full window has run
+    assert scheduler.break_seconds() == 0
+    # still degraded after the break: the next one is twice as long
+    scheduler.record(True, count=10)
+    assert scheduler.break_seconds() == 2
+    scheduler.take_break(scheduler.break_seconds(), locked, sleep=no_sleep)
+    scheduler.record(True, count=10)
+    assert scheduler.break_seconds() == 4
+    scheduler.take_break(scheduler.break_seconds(), locked, sleep=no_sleep)
+    # recovered: no break, and the next one is half as long
+    scheduler.record(False, 0.01, count=10)
+    assert scheduler.degraded_reason() is None
+    assert scheduler.break_seconds() == 0
+    scheduler.record(True, count=5)
+    assert scheduler.break_seconds() == 2
+    assert scheduler.breaks_taken == 3
+
+
+def test_break_length_is_capped():
+    scheduler = make_scheduler()
+    for _ in range(6):
+        scheduler.record(True, count=10)
+        scheduler.take_break(scheduler.break_seconds(), locked, sleep=no_sleep)
+    scheduler.record(True, count=10)
+    assert scheduler.break_seconds() == scheduler.max_break_seconds
+
+
+def test_latency_drift():
+    scheduler = make_scheduler()
+    scheduler.record(False, 0.03, count=10)
+    assert scheduler.degraded_reason().startswith("latency")
+    assert scheduler.break_seconds() == 1
+
+
+def test_clock_unlock():
+    scheduler = make_scheduler()
+    scheduler.record_clock(False)
+    assert scheduler.degraded_reason() == "clock not locked"
+    assert scheduler.break_seconds() == 1
+    scheduler.take_break(scheduler.break_seconds(), locked, sleep=no_sleep)
+    assert scheduler.degraded_reason() is None
+
+
+def test_break_seconds_per_try():
+    scheduler = make_scheduler()
+    assert scheduler.break_seconds_per_try() == 0
+    slept = []
+    scheduler.take_break(1, locked, sleep=slept.append)
+    assert slept == [1]
+    assert scheduler.break_seconds_per_try() == scheduler.total_break_seconds / 10
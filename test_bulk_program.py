@@ -0,0 +1,68 @@
+import json
+import os
+
+from bulk_program import program_device, program_devices, mock_scope_factory
+from programmer_n76_icp import FirmwareImage
+
+
+def quiet(*args):
+    pass
+
+
+def recording_scope_factory(devices: dict, missing=()):
+    """
+    `mock_scope_factory` that keeps the simulated target of each scope in `devices`, and has no scope for the serial
+    numbers in `missing`.
+    """
+    def factory(serial_number):
+        if serial_number in missing:
+            raise IOError("No scope with serial number {}".format(serial_number))
+        scope = mock_scope_factory(serial_number)
+        devices[serial_number] = scope._getNAEUSB().mock_icp
+        return scope
+    return factory
+
+
+def write_image(tmp_path, data: bytes) -> str:
+    path = tmp_path / "image.bin"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_program_devices(tmp_path):
+    data = bytes(range(256)) * 8
+    image_path = write_image(tmp_path, data)
+    cache_path = str(tmp_path / "program_cache.json")
+    serial_numbers = ["SN0", "SN1", "MISSING", "SN2", "SN3"]
+    devices = {}
+    results = program_devices(serial_numbers, image_path, recording_scope_factory(devices, missing={"MISSING"}),
+                              logfunc=quiet, program_cache=cache_path)
+    assert [result["serial_number"] for result in results] == serial_numbers
+    for result in results:
+        if result["serial_number"] == "MISSING":
+            # the missing scope doesn't stop the others
+            assert not result["ok"]
+            assert "No scope with serial number MISSING" in result["error"]
+            assert result["verify"] == "not run"
+            continue
+        device = devices[result["serial_number"]]
+        assert result["ok"], result["error"]
+        assert result["verify"] == "passed"
+        assert result["uid"] == device.uid.hex()
+        assert result["bytes_per_second"] > 0
+        assert bytes(device.flash[:len(data)]) == data
+    # every worker updated the cache, and it's still valid JSON with one record per device
+    with open(cache_path) as f:
+        cache = json.load(f)
+    assert len(cache) == len(devices)
+    assert {record["image_sha256"] for record in cache.values()} == {FirmwareImage.from_file(image_path).sha256}
+    assert not os.path.exists(cache_path + ".tmp")
+
+
+def test_program_device_missing_image(tmp_path):
+    devices = {}
+    result = program_device("SN0", str(tmp_path / "missing.bin"), recording_scope_factory(devices), logfunc=quiet)
+    assert not result["ok"]
+    assert result["error"].startswith("FileNotFoundError")
+    assert result["bytes_per_second"] is None
+    assert not devices
@@ -0,0 +1,119 @@
+import pytest
+
+from chipwhisperer.hardware.naeusb.naeusb import packuint32
+from programmer_n76_icp import newaeUSBICPLib, NUVO_CMD_CONNECT, NUVO_CMD_PAGE_ERASE, NUVO_SET_PROG_TIME, \
+    NUVO_SET_PAGE_ERASE_TIME, NUVO_ERR_OK, NUVO_ERR_FAILED, NU51_PAGE_SIZE
+from mocks.mock_icp_sim import MockN76ICPDevice, CONFIG0_LOCK
+
+
+class SimUSB:
+    """
+    Forwards the ICP control requests to the simulator, like `MockNAEUSB` does for REQ_NU51_ICP_PROGRAM.
+    """
+    def __init__(self, device: MockN76ICPDevice):
+        self.device = device
+
+    def sendCtrl(self, cmd, value=0, data=bytearray()):
+        self.device.sendCtrl(value, data)
+
+    def readCtrl(self, cmd, value=0, dlen=0):
+        return self.device.readCtrl(value, dlen)
+
+
+class SimScope:
+    def __init__(self, device: MockN76ICPDevice):
+        self._usb = SimUSB(device)
+
+    def _getNAEUSB(self):
+        return self._usb
+
+
+def connect(device: MockN76ICPDevice) -> newaeUSBICPLib:
+    lib = newaeUSBICPLib(SimScope(device), print_func=lambda *args: None)
+    lib._n51DoCmd(NUVO_CMD_CONNECT, bytearray())
+    return lib
+
+
+def test_status_only_reports_last_command():
+    # the firmware only keeps the status of the last command, so an error is lost once another command succeeds
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    device.config[0] &= ~CONFIG0_LOCK
+    lib._n51DoCmd(NUVO_CMD_PAGE_ERASE, packuint32(0), checkStatus=False)
+    assert lib._n51GetStatus()[:2] == bytearray([NUVO_CMD_PAGE_ERASE, NUVO_ERR_FAILED])
+    lib._n51DoCmd(NUVO_SET_PROG_TIME, packuint32(20) + packuint32(0), checkStatus=False)
+    assert lib._n51GetStatus()[:2] == bytearray([NUVO_SET_PROG_TIME, NUVO_ERR_OK])
+
+
+def test_error_attributed_to_failing_command():
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    device.config[0] &= ~CONFIG0_LOCK
+    with pytest.raises(IOError, match="PAGE_ERASE"):
+        lib.page_erase(0)
+    # a later command that succeeds doesn't hide the failure
+    lib.set_program_time(20, 0)
+    with pytest.raises(IOError, match="PAGE_ERASE"):
+        lib.page_erase(NU51_PAGE_SIZE)
+    lib.mass_erase()
+    assert not device.locked
+
+
+def test_batch_reads_status_once():
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    device.reset_counters()
+    lib.set_timings((20, 1), (5000, 2), (65000, 3))
+    # three setters and a single status read
+    assert device.transfers == 4
+    assert (device.program_time, device.page_erase_time, device.mass_erase_time) == ((20, 1), (5000, 2), (65000, 3))
+
+
+def test_batch_replays_to_attribute_error():
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    with pytest.raises(IOError, match="SET_PAGE_ERASE_TIME"):
+        with lib.batch():
+            lib.set_program_time(20, 0)
+            lib._n51DoCmd(NUVO_SET_PAGE_ERASE_TIME, packuint32(5000))
+    assert lib._batch is None
+
+
+def test_entry_syncs_batch():
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    lib.exit()
+    with lib.batch():
+        lib.set_program_time(20, 0)
+        lib._n51DoCmd(NUVO_SET_PAGE_ERASE_TIME, packuint32(5000))
+        # the failing setter is named before entry is sent
+        with pytest.raises(IOError, match="SET_PAGE_ERASE_TIME"):
+            lib.entry()
+        assert not device.in_icp
+        lib.entry()
+        assert device.in_icp
+
+
+def test_write_read_verify():
+    device = MockN76ICPDevice()
+    lib = connect(device)
+    data = bytes(range(256)) * 20
+    lib.write_flash(0, data)
+    assert lib.read_flash(0, len(data)) == data
+    for mode in ("checksum", "sample", "full"):
+        assert lib.verify_flash(0, data, mode)
+    lib.page_erase(NU51_PAGE_SIZE)
+    assert not lib.verify_flash(0, data, "full")
+
+
+@pytest.mark.parametrize("ram_buffer_size, max_ctrl_transfer, expected",
+                         [(256, 256, (256, 256)), (256, 200, (256, 128)), (256, 64, (256, 64)), (1024, 1024, (256, 256))])
+def test_negotiate_read_sizes(ram_buffer_size, max_ctrl_transfer, expected):
+    # the largest transfer size that works, and never a read bigger than the firmware's ram buffer
+    device = MockN76ICPDevice(ram_buffer_size=ram_buffer_size, max_ctrl_transfer=max_ctrl_transfer)
+    lib = connect(device)
+    data = bytes(range(256)) * 4
+    lib.write_flash(0, data)
+    assert lib.negotiate_read_sizes() == expected
+    assert lib.read_buffer_size <= newaeUSBICPLib.MAX_BUFFER_SIZE
+    assert lib.read_flash(0, len(data)) == data
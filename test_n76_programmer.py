@@ -0,0 +1,97 @@
+from bulk_program import mock_scope_factory
+from programmer_n76_icp import N76ICPProgrammer, FirmwareImage, ConfigFlags, N76E003_DEVID, NUVO_CMD_WRITE_FLASH, NUVO_CMD_PAGE_ERASE, NUVO_CMD_MASS_ERASE, NU51_PAGE_SIZE
+
+
+def quiet(*args):
+    pass
+
+
+def mock_programmer(**programmer_args):
+    """
+    Returns an open `N76ICPProgrammer` on a mock scope, and the scope's simulated target.
+    """
+    scope = mock_scope_factory("SN0")
+    programmer = N76ICPProgrammer(logfunc=quiet, scope=scope, **programmer_args)
+    programmer.open()
+    return programmer, scope._getNAEUSB().mock_icp
+
+
+def write_image(tmp_path, data: bytes, name: str = "image.bin") -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def flash(programmer: N76ICPProgrammer, image_path: str):
+    programmer.erase()
+    programmer.program(image_path, memtype="flash", verify=True)
+
+
+def test_differential_unchanged_image_writes_nothing(tmp_path):
+    data = bytes(range(256)) * 8
+    image_path = write_image(tmp_path, data)
+    programmer, device = mock_programmer(differential=True)
+    flash(programmer, image_path)
+    device.reset_counters()
+    flash(programmer, image_path)
+    assert device.commands.get(NUVO_CMD_WRITE_FLASH, 0) == 0
+    assert device.commands.get(NUVO_CMD_PAGE_ERASE, 0) == 0
+    assert device.commands.get(NUVO_CMD_MASS_ERASE, 0) == 0
+    assert bytes(device.flash[:len(data)]) == data
+
+
+def test_differential_one_page_change_writes_one_page(tmp_path):
+    data = bytes(range(256)) * 8
+    programmer, device = mock_programmer(differential=True)
+    flash(programmer, write_image(tmp_path, data))
+    changed = bytearray(data)
+    changed[3 * NU51_PAGE_SIZE + 5] ^= 0xFF
+    device.reset_counters()
+    flash(programmer, write_image(tmp_path, bytes(changed), "changed.bin"))
+    assert device.commands.get(NUVO_CMD_WRITE_FLASH, 0) == 1
+    assert device.commands.get(NUVO_CMD_PAGE_ERASE, 0) == 1
+    assert device.commands.get(NUVO_CMD_MASS_ERASE, 0) == 0
+    assert bytes(device.flash[:len(changed)]) == bytes(changed)
+    assert programmer.last_verify
+
+
+def test_program_cache_skips_unchanged_device(tmp_path):
+    data = bytes(range(256)) * 8
+    image_path = write_image(tmp_path, data)
+    programmer, device = mock_programmer(program_cache=str(tmp_path / "program_cache.json"))
+    flash(programmer, image_path)
+    device.reset_counters()
+    flash(programmer, image_path)
+    assert device.commands.get(NUVO_CMD_WRITE_FLASH, 0) == 0
+    assert device.commands.get(NUVO_CMD_MASS_ERASE, 0) == 0
+
+
+def test_program_cache_reprograms_stale_record(tmp_path):
+    data = bytes(range(256)) * 8
+    image_path = write_image(tmp_path, data)
+    programmer, device = mock_programmer(program_cache=str(tmp_path / "program_cache.json"))
+    flash(programmer, image_path)
+    # same UID, but the flash changed behind the cache's back; the first page is always read back
+    device.flash[0] ^= 0xFF
+    device.reset_counters()
+    flash(programmer, image_path)
+    assert device.commands.get(NUVO_CMD_WRITE_FLASH, 0) > 0
+    assert bytes(device.flash[:len(data)]) == data
+
+
+class ConfigReader:
+    def __init__(self, config: ConfigFlags):
+        self.config = config
+
+    def read_config(self) -> ConfigFlags:
+        return self.config
+
+
+def test_program_cache_empty_image(tmp_path):
+    programmer, device = mock_programmer(program_cache=str(tmp_path / "program_cache.json"))
+    image = FirmwareImage(b"")
+    config = ConfigFlags.from_bytes(programmer.config_bytes, N76E003_DEVID)
+    programmer.lastFlashedFile = "empty.bin"
+    programmer._record_programmed("key", image, config)
+    # the record matches, but there's no page to confirm it with on the target
+    assert not programmer._is_already_programmed(ConfigReader(config), "key", image, config)
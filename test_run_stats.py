@@ -0,0 +1,46 @@
+import pytest
+
+from run_stats import z_score, wilson_interval, required_sample_size_for_bound, EtaEstimator
+
+
+def test_z_score():
+    assert z_score(0.95) == pytest.approx(1.959964, abs=1e-6)
+    assert z_score(0.95, one_sided=True) == pytest.approx(1.644854, abs=1e-6)
+
+
+@pytest.mark.parametrize("count, total, one_sided, expected", [
+    (0, 10, False, (0.0, 0.2775)),
+    (5, 10, False, (0.2366, 0.7634)),
+    (10, 10, False, (0.7225, 1.0)),
+    (0, 100, True, (0.0, 0.0263)),
+])
+def test_wilson_interval_known_values(count, total, one_sided, expected):
+    low, high = wilson_interval(count, total, 0.95, one_sided=one_sided)
+    assert (low, high) == pytest.approx(expected, abs=1e-4)
+
+
+def test_wilson_interval_no_attempts():
+    assert wilson_interval(0, 0, 0.95) == (0.0, 1.0)
+
+
+def test_required_sample_size_for_bound():
+    # with no events, the one-sided upper bound is z^2 / (n + z^2)
+    n = required_sample_size_for_bound(0.95, 0.03)
+    assert n == 88
+    assert wilson_interval(0, n, 0.95, one_sided=True)[1] <= 0.03 < wilson_interval(0, n - 1, 0.95, one_sided=True)[1]
+    assert required_sample_size_for_bound(0.95, 0.03, population=50) == 50
+    with pytest.raises(ValueError):
+        required_sample_size_for_bound(0.95, 0.01, expected_rate=0.01)
+
+
+def test_eta_estimator():
+    eta = EtaEstimator(alpha=0.5)
+    assert eta.estimate(10) is None
+    eta.add("normal", 4.0, count=4)
+    assert eta.seconds_per_attempt() == 1.0
+    eta.add("reset", 3.0)
+    eta.add("skipped", 0.5, count=5)
+    assert eta.reset_rate == pytest.approx(0.5)
+    # skipped tries don't change the reset rate
+    assert eta.seconds_per_attempt() == pytest.approx(2.0)
+    assert eta.estimate(10, remaining_skipped=4, break_seconds=2.0) == pytest.approx(10 * 2.0 + 4 * 0.1 + 2.0)
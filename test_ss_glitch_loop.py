@@ -0,0 +1,74 @@
+import logging
+
+from mocks.mock_ss2_sim import SimpleSerial2TargetSim, SS_ERR_OK, SS_ERR_LEN, MOCK_SS_RESET, RESET_RESULT, SUCCESS_RESULT, NORMAL_RESULT
+from ss_glitch_loop_test import SSGlitchLoopTest, BURST_CMD, BYTES_READ, MAX_BURST_SIZE
+from TestSetup import TestResult
+
+
+class ScriptedTarget:
+    """
+    Runs the simulator's burst command with a scripted result for each attempt, and keeps the response payload.
+    """
+    def __init__(self, results):
+        self.results = list(results)
+        self.responses = []
+        self.sim = SimpleSerial2TargetSim(self.trigger)
+        self.sim.send_response = lambda resp_code, data: self.responses.append((resp_code, bytes(data)))
+
+    def trigger(self, high: bool) -> int:
+        return self.results.pop(0) if high else NORMAL_RESULT
+
+    def burst(self, attempts: int):
+        err = self.sim.cmds[BURST_CMD](BURST_CMD, 0, 1, bytearray([attempts]))
+        data = self.responses[-1][1] if self.responses else None
+        return err, data
+
+
+def make_test(burst_size: int) -> SSGlitchLoopTest:
+    # check_burst_result only needs the burst size and a logger
+    test = SSGlitchLoopTest.__new__(SSGlitchLoopTest)
+    test._current_burst_size = burst_size
+    test._printed_success_warning = False
+    test.logger = logging.getLogger("test_ss_glitch_loop")
+    return test
+
+
+def test_full_burst():
+    target = ScriptedTarget([NORMAL_RESULT] * 5)
+    err, data = target.burst(5)
+    assert err == SS_ERR_OK
+    assert len(data) == 5 * BYTES_READ
+    assert make_test(5).check_burst_result(data) == [TestResult.normal] * 5
+
+
+def test_full_burst_with_success():
+    target = ScriptedTarget([NORMAL_RESULT, NORMAL_RESULT, SUCCESS_RESULT, NORMAL_RESULT])
+    err, data = target.burst(4)
+    assert err != SS_ERR_OK
+    assert make_test(4).check_burst_result(data) == [TestResult.normal, TestResult.normal, TestResult.success, TestResult.normal]
+
+
+def test_truncated_burst():
+    # the target resets on the third attempt and never answers
+    target = ScriptedTarget([NORMAL_RESULT, NORMAL_RESULT, RESET_RESULT])
+    err, data = target.burst(5)
+    assert err == MOCK_SS_RESET
+    assert data is None
+    assert make_test(5).check_burst_result(data) == [TestResult.reset]
+    # a short answer can't be attributed to an attempt either
+    target = ScriptedTarget([NORMAL_RESULT] * 5)
+    _, data = target.burst(5)
+    assert make_test(5).check_burst_result(data[:-BYTES_READ]) == [TestResult.reset]
+
+
+def test_max_burst_size():
+    target = ScriptedTarget([NORMAL_RESULT] * MAX_BURST_SIZE)
+    err, data = target.burst(MAX_BURST_SIZE)
+    assert err == SS_ERR_OK
+    assert len(data) == MAX_BURST_SIZE * BYTES_READ <= 255
+    assert make_test(MAX_BURST_SIZE).check_burst_result(data) == [TestResult.normal] * MAX_BURST_SIZE
+    # one more doesn't fit in a SimpleSerial2 payload
+    target = ScriptedTarget([NORMAL_RESULT] * (MAX_BURST_SIZE + 1))
+    err, data = target.burst(MAX_BURST_SIZE + 1)
+    assert err == SS_ERR_LEN
+    assert data is None
@@ -0,0 +1,59 @@
+import numpy as np
+
+from trace_analysis import welch_t, top_windows, group_stats
+from trace_stats import RunningTraceStats
+
+
+def stats_of(traces) -> RunningTraceStats:
+    traces = np.asarray(traces, dtype=np.float64)
+    stats = RunningTraceStats(traces.shape[1])
+    stats.add_many(traces)
+    return stats
+
+
+def test_welch_t_matches_formula():
+    rng = np.random.default_rng(0)
+    a = rng.normal(1.0, 0.5, size=(40, 8))
+    b = rng.normal(0.0, 1.0, size=(60, 8))
+    expected = (a.mean(axis=0) - b.mean(axis=0)) / np.sqrt(a.var(axis=0, ddof=1) / 40 + b.var(axis=0, ddof=1) / 60)
+    np.testing.assert_allclose(welch_t(stats_of(a), stats_of(b)), expected)
+
+
+def test_welch_t_zero_variance():
+    # sample 0: constant and equal, sample 1: constant but different, sample 2: varies in one group only
+    a = [[1.0, 2.0, 0.0], [1.0, 2.0, 2.0]]
+    b = [[1.0, 1.0, 1.0], [1.0, 1.0, 1.0], [1.0, 1.0, 1.0]]
+    t = welch_t(stats_of(a), stats_of(b))
+    assert np.isnan(t[0])
+    assert t[1] == np.inf
+    assert np.isfinite(t[2]) and t[2] == 0
+    assert welch_t(stats_of(b), stats_of(a))[1] == -np.inf
+
+
+def test_welch_t_single_trace_groups():
+    t = welch_t(stats_of([[1.0, 1.0]]), stats_of([[0.0, 1.0]]))
+    assert t[0] == np.inf
+    assert np.isnan(t[1])
+
+
+def test_top_windows_ranks_inf_first_and_ignores_nan():
+    t = np.zeros(40)
+    t[5:9] = np.nan
+    t[20:24] = 3.0
+    t[30] = -np.inf
+    windows = top_windows(t, window=4, count=2)
+    assert windows[0]["start"] <= 30 < windows[0]["end"]
+    assert windows[0]["mean_abs_t"] == np.inf
+    assert windows[1] == {"start": 20, "end": 24, "mean_abs_t": 3.0}
+
+
+def test_group_stats_chunks():
+    rng = np.random.default_rng(1)
+    traces = rng.normal(size=(50, 6)).astype(np.float32)
+    keys = ["normal" if i % 3 else "success" for i in range(50)]
+    stats = group_stats(traces, keys, chunk_size=7)
+    for key in ("normal", "success"):
+        selected = traces[[k == key for k in keys]].astype(np.float64)
+        assert stats[key].count == len(selected)
+        np.testing.assert_allclose(stats[key].mean, selected.mean(axis=0))
+        np.testing.assert_allclose(stats[key].variance, selected.var(axis=0, ddof=1))
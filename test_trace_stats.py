@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from trace_stats import RunningTraceStats, GroupedTraceStats
+
+
+def random_traces(count: int, samples: int = 32, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # a large offset makes naive sum-of-squares variance lose precision
+    return rng.normal(1000.0, 0.01, size=(count, samples))
+
+
+def assert_matches(stats: RunningTraceStats, traces: np.ndarray):
+    assert stats.count == len(traces)
+    np.testing.assert_allclose(stats.mean, np.mean(traces, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.variance, np.var(traces, axis=0, ddof=1), rtol=1e-6)
+    np.testing.assert_array_equal(stats.min, traces.min(axis=0))
+    np.testing.assert_array_equal(stats.max, traces.max(axis=0))
+
+
+def test_welford_matches_numpy():
+    traces = random_traces(200)
+    stats = RunningTraceStats(traces.shape[1])
+    for trace in traces:
+        stats.add(trace)
+    assert_matches(stats, traces)
+
+
+def test_chan_merge_matches_numpy():
+    traces = random_traces(250, seed=1)
+    stats = RunningTraceStats(traces.shape[1])
+    # uneven chunks, mixed with single adds
+    for trace in traces[:3]:
+        stats.add(trace)
+    stats.add_many(traces[3:10])
+    stats.add_many(traces[10:10])
+    stats.add_many(traces[10:200])
+    stats.add(traces[200])
+    stats.add_many(traces[201:])
+    assert_matches(stats, traces)
+
+
+def test_chan_merge_into_empty():
+    traces = random_traces(5, seed=2)
+    stats = RunningTraceStats(traces.shape[1])
+    stats.add_many(traces)
+    assert_matches(stats, traces)
+
+
+def test_variance_needs_two_traces():
+    stats = RunningTraceStats(4)
+    stats.add(np.ones(4))
+    np.testing.assert_array_equal(stats.variance, np.zeros(4))
+
+
+def test_rejects_wrong_shape():
+    stats = RunningTraceStats(4)
+    with pytest.raises(ValueError):
+        stats.add(np.zeros(5))
+    with pytest.raises(ValueError):
+        stats.add_many(np.zeros((2, 5)))
+
+
+def test_grouped_save_load(tmp_path):
+    grouped = GroupedTraceStats()
+    traces = random_traces(20, samples=8, seed=3)
+    for i, trace in enumerate(traces):
+        grouped.add("reset" if i % 4 == 0 else "normal", trace)
+    path = str(tmp_path / "stats.npz")
+    grouped.save(path)
+    loaded = GroupedTraceStats.load(path)
+    assert set(loaded.groups) == {"normal", "reset"}
+    for group in ("normal", "reset"):
+        assert loaded[group].count == grouped[group].count
+        np.testing.assert_allclose(loaded[group].mean, grouped[group].mean)
+        np.testing.assert_allclose(loaded[group].variance, grouped[group].variance)
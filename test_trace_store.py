@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+from trace_store import TraceMemmapWriter, metadata_path
+
+
+def make_traces(count: int, samples: int = 16) -> np.ndarray:
+    return np.arange(count * samples, dtype=np.float32).reshape(count, samples) / 100
+
+
+def test_header_rewritten_as_file_grows(tmp_path):
+    path = str(tmp_path / "traces.npy")
+    traces = make_traces(11)
+    writer = TraceMemmapWriter(path, 16, "float32", initial_capacity=2, metadata={"name": "test"})
+    for trace in traces[:5]:
+        writer.append(trace)
+    writer.flush()
+    # readable while the capture is still running
+    loaded = np.load(path, mmap_mode="r")
+    assert loaded.shape == (5, 16)
+    np.testing.assert_array_equal(loaded, traces[:5])
+    with open(metadata_path(path)) as f:
+        assert json.load(f) == {"name": "test", "dtype": "float32", "samples": 16, "count": 5}
+    for trace in traces[5:]:
+        writer.append(trace)
+    np.testing.assert_array_equal(writer.traces, traces)
+    closed = writer.close()
+    np.testing.assert_array_equal(closed, traces)
+    # reopened from disk, trimmed to the written traces
+    reopened = np.load(path)
+    assert reopened.dtype == np.float32
+    np.testing.assert_array_equal(reopened, traces)
+
+
+def test_int16_metadata(tmp_path):
+    path = str(tmp_path / "traces.npy")
+    writer = TraceMemmapWriter(path, 4, "int16", initial_capacity=1)
+    writer.append(np.array([0, 256, 512, 1023], dtype=np.int16))
+    writer.append(np.array([1, 2, 3, 4], dtype=np.int16))
+    writer.close()
+    assert np.load(path).tolist() == [[0, 256, 512, 1023], [1, 2, 3, 4]]
+    with open(metadata_path(path)) as f:
+        meta = json.load(f)
+    assert meta["count"] == 2 and meta["int_scale"] == 1024 and meta["int_offset"] == 0.5
+
+
+def test_empty_writer(tmp_path):
+    path = str(tmp_path / "traces.npy")
+    closed = TraceMemmapWriter(path, 8).close()
+    assert closed.shape == (0, 8)
+    assert np.load(path).shape == (0, 8)
+
+
+def test_rejects_wrong_length(tmp_path):
+    writer = TraceMemmapWriter(str(tmp_path / "traces.npy"), 8)
+    with pytest.raises(ValueError):
+        writer.append(np.zeros(7))
+
+
+def test_remove(tmp_path):
+    path = str(tmp_path / "traces.npy")
+    writer = TraceMemmapWriter(path, 4)
+    writer.append(np.ones(4))
+    traces = writer.close()
+    writer.remove()
+    assert not (tmp_path / "traces.npy").exists()
+    assert not (tmp_path / "traces.json").exists()
+    # the returned memmap outlives the file
+    assert traces.sum() == 4
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+import numpy as np
+from trace_store import traces_to_float
+
+DEFAULT_MAX_SHIFT = 50
+DEFAULT_CHUNK_SIZE = 256
+
+
+def _next_pow2(n: int) -> int:
+    return 1 << (n - 1).bit_length()
+
+
+def align_chunk(traces: np.ndarray, reference: np.ndarray, roi_start: int, max_shift: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Aligns a chunk of traces to `reference` (a window that starts at sample `roi_start` of an aligned trace).
+
+    Returns the per-trace shifts (positive = the trace is late) and the sum of the aligned traces.
+    Samples shifted in from outside the trace repeat the edge sample.
+    """
+    traces = traces_to_float(traces)
+    count, samples = traces.shape
+    seg_start = roi_start - max_shift
+    seg_end = roi_start + len(reference) + max_shift
+    segments = traces[:, seg_start:seg_end]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    ref = reference - reference.mean()
+    nfft = _next_pow2(segments.shape[1] + len(ref))
+    # corr[:, k] = sum_n segment[n + k] * ref[n]; lag k = max_shift means no shift
+    corr = np.fft.irfft(np.fft.rfft(segments, nfft, axis=1) * np.conj(np.fft.rfft(ref, nfft)), nfft, axis=1)[:, :2 * max_shift + 1]
+    shifts = np.argmax(corr, axis=1) - max_shift
+    idx = np.clip(np.arange(samples)[None, :] + shifts[:, None], 0, samples - 1)
+    aligned = np.take_along_axis(traces, idx, axis=1)
+    return shifts, aligned.sum(axis=0)
+
+
+def _align_file_chunk(path: str, start: int, end: int, reference: np.ndarray, roi_start: int, max_shift: int) -> tuple[np.ndarray, np.ndarray]:
+    traces = np.load(path, mmap_mode="r")
+    return align_chunk(np.asarray(traces[start:end]), reference, roi_start, max_shift)
+
+
+def align_traces(traces: Union[str, np.ndarray], reference_roi: Optional[tuple[int, int]] = None, max_shift: int = DEFAULT_MAX_SHIFT,
+                 reference: Optional[np.ndarray] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Aligns a set of traces to a reference window by FFT cross-correlation and averages them.
+
+    Args:
+      - traces (`Union[str, np.ndarray]`): A .npy path (opened memory-mapped), a memmap, or an array of traces.
+      - reference_roi (`Optional[tuple[int, int]]`) [default = `None`]: The [start, end) samples the alignment matches. `None` for the whole trace minus `max_shift` on both ends.
+      - max_shift (`int`) [default = `50`]: The largest shift (in samples) searched for.
+      - reference (`Optional[np.ndarray]`) [default = `None`]: The reference window; defaults to the mean of the first chunk over `reference_roi`.
+      - chunk_size (`int`) [default = `256`]: The number of traces aligned at once.
+      - workers (`Optional[int]`) [default = `None`]: The number of worker processes; `None` for one per core, 1 to align in this process.
+
+    Returns:
+      (aligned mean trace, per-trace shifts)
+    """
+    path = traces if isinstance(traces, str) else getattr(traces, "filename", None)
+    data = np.load(path, mmap_mode="r") if isinstance(traces, str) else traces
+    count, samples = data.shape
+    if reference_roi is None:
+        reference_roi = (max_shift, samples - max_shift)
+    roi_start, roi_end = reference_roi
+    max_shift = min(max_shift, roi_start, samples - roi_end)
+    if reference is None:
+        reference = traces_to_float(data[:min(chunk_size, count), roi_start:roi_end]).mean(axis=0)
+    bounds = [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(bounds) <= 1:
+        results = [align_chunk(np.asarray(data[start:end]), reference, roi_start, max_shift) for start, end in bounds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if path and os.path.exists(path) and path.endswith(".npy"):
+                # workers open the file themselves instead of getting the traces pickled
+                futures = [executor.submit(_align_file_chunk, path, start, end, reference, roi_start, max_shift) for start, end in bounds]
+            else:
+                futures = [executor.submit(align_chunk, np.asarray(data[start:end]), reference, roi_start, max_shift) for start, end in bounds]
+            results = [future.result() for future in futures]
+    shifts = np.concatenate([chunk_shifts for chunk_shifts, _ in results])
+    aligned_mean = np.sum([chunk_sum for _, chunk_sum in results], axis=0) / count
+    return aligned_mean, shifts
@@ -0,0 +1,118 @@
+import csv
+from typing import Any, Optional, Union
+import numpy as np
+from trace_stats import RunningTraceStats
+from trace_store import traces_to_float
+
+DEFAULT_CHUNK_SIZE = 1024
+DEFAULT_WINDOW = 16
+
+
+def load_trace_index(index_path: str) -> tuple[list[str], list[tuple], np.ndarray, list[str], list[str]]:
+    """
+    Reads an IndexedTraceStore index CSV.
+    Returns (params, settings, try numbers, results, labels), ordered by trace index.
+    """
+    with open(index_path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        params = header[1:-3]
+        rows = sorted(reader, key=lambda row: int(row[0]))
+    settings = [tuple(float(x) for x in row[1:1 + len(params)]) for row in rows]
+    tries = np.array([int(row[-3]) for row in rows], dtype=np.int64)
+    results = [row[-2] for row in rows]
+    labels = [row[-1] for row in rows]
+    return params, settings, tries, results, labels
+
+
+def group_stats(traces: Union[str, np.ndarray], keys: list, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[Any, RunningTraceStats]:
+    """
+    Accumulates per-group stats over memory-mapped traces, `chunk_size` traces at a time. `keys[i]` is the group of trace i.
+    """
+    data = np.load(traces, mmap_mode="r") if isinstance(traces, str) else traces
+    samples = data.shape[1]
+    stats: dict[Any, RunningTraceStats] = {}
+    key_ids = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+    key_list = list(key_ids)
+    key_idx = np.array([key_ids[key] for key in keys], dtype=np.int64)
+    for start in range(0, len(keys), chunk_size):
+        chunk = traces_to_float(data[start:start + chunk_size])
+        chunk_keys = key_idx[start:start + chunk_size]
+        for key_id in np.unique(chunk_keys):
+            key = key_list[key_id]
+            if key not in stats:
+                stats[key] = RunningTraceStats(samples)
+            stats[key].add_many(chunk[chunk_keys == key_id])
+    return stats
+
+
+def welch_t(a: RunningTraceStats, b: RunningTraceStats) -> np.ndarray:
+    """
+    Welch's t-statistic per sample between two groups.
+    Samples that don't vary in either group are +/-inf if the means differ and NaN if they don't.
+    """
+    denominator = np.sqrt(a.variance / max(a.count, 1) + b.variance / max(b.count, 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (a.mean - b.mean) / denominator
+
+
+def top_windows(t: np.ndarray, window: int = DEFAULT_WINDOW, count: int = 5) -> list[dict[str, Any]]:
+    """
+    Returns the `count` non-overlapping `window`-sample windows with the highest mean |t|.
+    Infinite t (a difference with no variance) ranks above any finite t, NaN (no difference and no variance) counts as 0.
+    """
+    window = max(1, min(window, len(t)))
+    abs_t = np.where(np.isnan(t), 0.0, np.abs(t))
+    score = np.convolve(abs_t, np.ones(window) / window, mode="valid")
+    windows = []
+    for start in np.argsort(score)[::-1]:
+        start = int(start)
+        if any(abs(start - w["start"]) < window for w in windows):
+            continue
+        windows.append({"start": start, "end": start + window, "mean_abs_t": float(score[start])})
+        if len(windows) == count:
+            break
+    return windows
+
+
+def analyze_traces(traces_path: str, index_path: str, group_by: Optional[Union[str, list[str]]] = None, group_a: str = "success",
+                   group_b: str = "normal", window: int = DEFAULT_WINDOW, top: int = 5, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[Any, dict[str, Any]]:
+    """
+    Compares two result groups (by default success vs normal) of stored glitch-run traces.
+
+    Args:
+      - traces_path (`str`): The IndexedTraceStore .npy file.
+      - index_path (`str`): Its index CSV.
+      - group_by (`Optional[Union[str, list[str]]]`) [default = `None`]: `None` to compare over all traces, `"setting"` per glitch setting, or a list of params to compare per slice of those params.
+      - group_a, group_b (`str`): The result groups to compare. Traces of `group_b` (the baseline) that the trace classifier labelled anomalous are kept out of it, in a `"<group_b> (anomalous)"` group.
+      - window (`int`) [default = `16`]: The width of the reported sample windows.
+      - top (`int`) [default = `5`]: How many windows to report per slice.
+
+    Returns:
+      A dict of slice key -> {"means": {result: mean trace}, "counts": {result: count}, "t": t-statistic per sample, "windows": top windows}.
+      Slices missing either group only have means and counts.
+    """
+    params, settings, _, results, labels = load_trace_index(index_path)
+    # traces stored because the classifier flagged them would skew the baseline
+    results = [result + " (anomalous)" if result == group_b and label == "anomalous" else result for result, label in zip(results, labels)]
+    if group_by is None:
+        slice_keys = [()] * len(settings)
+    elif group_by == "setting":
+        slice_keys = settings
+    else:
+        idxs = [params.index(param) for param in group_by]
+        slice_keys = [tuple(setting[i] for i in idxs) for setting in settings]
+    stats = group_stats(traces_path, list(zip(slice_keys, results)), chunk_size)
+    analysis: dict[Any, dict[str, Any]] = {}
+    for (slice_key, result), group in stats.items():
+        entry = analysis.setdefault(slice_key, {"means": {}, "counts": {}})
+        entry["means"][result] = group.mean
+        entry["counts"][result] = group.count
+    for slice_key, entry in analysis.items():
+        a = stats.get((slice_key, group_a))
+        b = stats.get((slice_key, group_b))
+        if a is None or b is None:
+            continue
+        entry["t"] = welch_t(a, b)
+        entry["windows"] = top_windows(entry["t"], window, top)
+    return analysis
@@ -0,0 +1,61 @@
+from enum import Enum
+from typing import Optional
+import numpy as np
+from trace_stats import RunningTraceStats
+
+
+class TraceLabel(Enum):
+    normal = 0
+    crashed = 1
+    anomalous = 2
+
+    def __str__(self):
+        return self.name.lower()
+
+
+class TraceClassifier:
+    """
+    Labels a power trace by comparing it to a reference profile (per-sample mean and std of normal traces, e.g. from a dry run).
+
+    On the region of interest, a trace whose Pearson correlation with the reference mean is below `crash_correlation`
+    has lost the normal program's shape and is labelled crashed. A trace that correlates but whose mean absolute
+    z-distance from the reference is above `anomaly_z` is labelled anomalous.
+    """
+    def __init__(self, reference_mean: np.ndarray, reference_std: np.ndarray, roi: Optional[tuple[int, int]] = None,
+                 crash_correlation: float = 0.5, anomaly_z: float = 4.0):
+        if roi is None:
+            roi = (0, len(reference_mean))
+        self.roi = slice(roi[0], roi[1])
+        self.crash_correlation = crash_correlation
+        self.anomaly_z = anomaly_z
+        self._mean = np.asarray(reference_mean, dtype=np.float64)[self.roi]
+        # floor the std so flat samples don't blow up the distance
+        std = np.asarray(reference_std, dtype=np.float64)[self.roi]
+        self._inv_std = 1.0 / np.maximum(std, max(float(np.median(std)), 1e-6) * 0.1)
+        self._centered = self._mean - self._mean.mean()
+        self._norm = np.linalg.norm(self._centered)
+
+    @classmethod
+    def from_stats(cls, stats: RunningTraceStats, roi: Optional[tuple[int, int]] = None, crash_correlation: float = 0.5, anomaly_z: float = 4.0) -> "TraceClassifier":
+        return cls(stats.mean, stats.std, roi, crash_correlation, anomaly_z)
+
+    def correlation(self, trace: np.ndarray) -> float:
+        x = np.asarray(trace, dtype=np.float64)[self.roi]
+        x = x - x.mean()
+        denominator = np.linalg.norm(x) * self._norm
+        if denominator == 0:
+            return 0.0
+        return float(np.dot(x, self._centered) / denominator)
+
+    def z_distance(self, trace: np.ndarray) -> float:
+        x = np.asarray(trace, dtype=np.float64)[self.roi]
+        return float(np.mean(np.abs(x - self._mean) * self._inv_std))
+
+    def classify(self, trace: np.ndarray) -> TraceLabel:
+        if len(trace) < self.roi.stop:
+            return TraceLabel.anomalous
+        if self.correlation(trace) < self.crash_correlation:
+            return TraceLabel.crashed
+        if self.z_distance(trace) > self.anomaly_z:
+            return TraceLabel.anomalous
+        return TraceLabel.normal
@@ -0,0 +1,115 @@
+from typing import Optional
+import numpy as np
+
+
+class RunningTraceStats:
+    """
+    Per-sample running mean, variance, min and max of a stream of traces (Welford's algorithm).
+    Memory use is O(samples), no matter how many traces are added.
+    """
+    def __init__(self, samples: int):
+        self.samples = samples
+        self.count = 0
+        self.mean = np.zeros(samples, dtype=np.float64)
+        self._m2 = np.zeros(samples, dtype=np.float64)
+        self.min = np.full(samples, np.inf, dtype=np.float64)
+        self.max = np.full(samples, -np.inf, dtype=np.float64)
+
+    def add(self, trace: np.ndarray):
+        trace = np.asarray(trace, dtype=np.float64)
+        if len(trace) != self.samples:
+            raise ValueError("Trace has %d samples, expected %d" % (len(trace), self.samples))
+        self.count += 1
+        delta = trace - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (trace - self.mean)
+        np.minimum(self.min, trace, out=self.min)
+        np.maximum(self.max, trace, out=self.max)
+
+    def add_many(self, traces: np.ndarray):
+        """
+        Adds a 2D array of traces at once, merging their stats in with Chan et al.'s parallel update.
+        """
+        traces = np.asarray(traces, dtype=np.float64)
+        if traces.ndim != 2 or traces.shape[1] != self.samples:
+            raise ValueError("Traces have shape %s, expected (n, %d)" % (str(traces.shape), self.samples))
+        count = len(traces)
+        if count == 0:
+            return
+        mean = traces.mean(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (count / total)
+        self._m2 += ((traces - mean) ** 2).sum(axis=0) + delta ** 2 * (self.count * count / total)
+        self.count = total
+        np.minimum(self.min, traces.min(axis=0), out=self.min)
+        np.maximum(self.max, traces.max(axis=0), out=self.max)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        The per-sample (sample) variance; zeros until at least 2 traces were added.
+        """
+        if self.count < 2:
+            return np.zeros(self.samples, dtype=np.float64)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class GroupedTraceStats:
+    """
+    RunningTraceStats kept separately for each outcome group (e.g. "normal", "reset", "success").
+    """
+    def __init__(self):
+        self.groups: dict[str, RunningTraceStats] = {}
+
+    def add(self, group: str, trace: np.ndarray):
+        stats = self.groups.get(group)
+        if stats is None:
+            stats = self.groups[group] = RunningTraceStats(len(trace))
+        stats.add(trace)
+
+    def get(self, group: str) -> Optional[RunningTraceStats]:
+        return self.groups.get(group)
+
+    def __getitem__(self, group: str) -> RunningTraceStats:
+        return self.groups[group]
+
+    def __contains__(self, group: str) -> bool:
+        return group in self.groups
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = {}
+        for group, stats in self.groups.items():
+            arrays[group + "_count"] = np.array(stats.count)
+            arrays[group + "_mean"] = stats.mean
+            arrays[group + "_var"] = stats.variance
+            arrays[group + "_min"] = stats.min
+            arrays[group + "_max"] = stats.max
+        return arrays
+
+    def save(self, path: str):
+        """
+        Saves the per-group summary arrays (`<group>_count`, `_mean`, `_var`, `_min`, `_max`) to an .npz file.
+        """
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> "GroupedTraceStats":
+        grouped = cls()
+        with np.load(path) as arrays:
+            for key in arrays.files:
+                if not key.endswith("_count"):
+                    continue
+                group = key[:-len("_count")]
+                stats = RunningTraceStats(len(arrays[group + "_mean"]))
+                stats.count = int(arrays[key])
+                stats.mean = arrays[group + "_mean"].copy()
+                stats._m2 = arrays[group + "_var"] * max(stats.count - 1, 0)
+                stats.min = arrays[group + "_min"].copy()
+                stats.max = arrays[group + "_max"].copy()
+                grouped.groups[group] = stats
+        return grouped
@@ -0,0 +1,270 @@
+import json
+import os
+from typing import Any, Optional
+import numpy as np
+import chipwhisperer as cw
+
+# get_last_trace(as_int=True) returns raw ADC counts; get_last_trace() returns counts / INT_TRACE_SCALE - INT_TRACE_OFFSET (10-bit ADC on the CW-Lite)
+INT_TRACE_SCALE = 1024
+INT_TRACE_OFFSET = 0.5
+TRACE_DTYPES = ["int16", "float32"]
+
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# fixed header size so the shape can be rewritten in place as the file grows
+_NPY_HEADER_SIZE = 128
+
+
+def _npy_header(dtype: np.dtype, shape: tuple) -> bytes:
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(dtype), shape)
+    header_len = _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2
+    header = header.ljust(header_len - 1) + "\n"
+    if len(header) != header_len:
+        raise ValueError("npy header too long for shape %s" % str(shape))
+    return _NPY_MAGIC + header_len.to_bytes(2, "little") + header.encode("latin1")
+
+
+def traces_to_float(traces: np.ndarray) -> np.ndarray:
+    """
+    Converts stored traces (raw int16 ADC values or float32) to the float64 values get_last_trace() returns.
+    """
+    traces = np.asarray(traces)
+    if traces.dtype == np.int16:
+        return traces.astype(np.float64) / INT_TRACE_SCALE - INT_TRACE_OFFSET
+    return traces.astype(np.float64)
+
+
+def metadata_path(npy_path: str) -> str:
+    return os.path.splitext(npy_path)[0] + ".json"
+
+
+class TraceMemmapWriter:
+    """
+    Appends fixed-length traces to a memory-mapped .npy file that grows as needed, so captures don't have to fit in RAM
+    and survive a crash up to the last `flush()`.
+
+    The .npy header and the metadata file (`<name>.json`) are updated on every flush, so the file can be loaded with
+    `np.load(path, mmap_mode='r')` at any point.
+    """
+    def __init__(self, path: str, samples: int, dtype: str = "float32", initial_capacity: int = 1024, metadata: Optional[dict[str, Any]] = None):
+        if dtype not in TRACE_DTYPES:
+            raise ValueError("dtype must be one of %s" % str(TRACE_DTYPES))
+        self.path = path
+        self.samples = samples
+        self.dtype = np.dtype(dtype)
+        self.metadata = metadata if metadata else {}
+        self.count = 0
+        self._capacity = max(1, initial_capacity)
+        with open(self.path, "wb") as f:
+            f.write(_npy_header(self.dtype, (0, self.samples)))
+            f.truncate(_NPY_HEADER_SIZE + self._capacity * self.samples * self.dtype.itemsize)
+        self._map()
+
+    def _map(self):
+        self._memmap = np.memmap(self.path, dtype=self.dtype, mode="r+", offset=_NPY_HEADER_SIZE, shape=(self._capacity, self.samples))
+
+    def _grow(self):
+        self._memmap.flush()
+        del self._memmap
+        self._capacity *= 2
+        with open(self.path, "r+b") as f:
+            f.truncate(_NPY_HEADER_SIZE + self._capacity * self.samples * self.dtype.itemsize)
+        self._map()
+
+    def append(self, trace: np.ndarray):
+        if len(trace) != self.samples:
+            raise ValueError("Trace has %d samples, expected %d" % (len(trace), self.samples))
+        if self.count == self._capacity:
+            self._grow()
+        self._memmap[self.count] = trace
+        self.count += 1
+
+    @property
+    def traces(self) -> np.ndarray:
+        """
+        The traces written so far (a view into the memmap).
+        """
+        return self._memmap[:self.count]
+
+    def flush(self):
+        self._memmap.flush()
+        with open(self.path, "r+b") as f:
+            f.write(_npy_header(self.dtype, (self.count, self.samples)))
+        meta = dict(self.metadata)
+        meta.update({"dtype": self.dtype.name, "samples": self.samples, "count": self.count})
+        if self.dtype == np.int16:
+            meta.update({"int_scale": INT_TRACE_SCALE, "int_offset": INT_TRACE_OFFSET})
+        with open(metadata_path(self.path) + ".tmp", "w") as f:
+            f.write(json.dumps(meta, indent=4))
+        os.replace(metadata_path(self.path) + ".tmp", metadata_path(self.path))
+
+    def close(self) -> np.ndarray:
+        """
+        Flushes, trims the file to the written traces and returns them as a read-only memmap.
+        """
+        self.flush()
+        del self._memmap
+        with open(self.path, "r+b") as f:
+            f.truncate(_NPY_HEADER_SIZE + self.count * self.samples * self.dtype.itemsize)
+        self._memmap = np.memmap(self.path, dtype=self.dtype, mode="r", offset=_NPY_HEADER_SIZE, shape=(self.count, self.samples)) if self.count else np.zeros((0, self.samples), dtype=self.dtype)
+        return self._memmap
+
+    def remove(self):
+        """
+        Deletes the .npy and metadata files, e.g. once the traces have been copied into segments. The memmap returned by
+        `close()` stays readable on POSIX systems, where an open mapping keeps the deleted file's data around.
+        """
+        for path in (self.path, metadata_path(self.path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class IndexedTraceStore:
+    """
+    Stores selected traces of a glitch run in a TraceMemmapWriter (`<name>.npy`), with a CSV index (`<name>_index.csv`)
+    mapping each stored trace to its glitch setting, try number, result and trace label.
+    """
+    def __init__(self, path: str, params: list[str], dtype: str = "float32", metadata: Optional[dict[str, Any]] = None):
+        self.path = path
+        self.params = params
+        self.dtype = dtype
+        self.metadata = metadata
+        self._writer: Optional[TraceMemmapWriter] = None
+        self.index_path = os.path.splitext(path)[0] + "_index.csv"
+        self._index_file = open(self.index_path, "w")
+        self._index_file.write("index," + ",".join(params) + ",try,result,label\n")
+
+    @property
+    def count(self) -> int:
+        return self._writer.count if self._writer else 0
+
+    def append(self, trace: np.ndarray, setting, try_num: int, result: str, label: str = ""):
+        if self._writer is None:
+            self._writer = TraceMemmapWriter(self.path, len(trace), self.dtype, initial_capacity=64, metadata=self.metadata)
+        self._index_file.write("%d,%s,%d,%s,%s\n" % (self._writer.count, ",".join(str(x) for x in setting), try_num, result, label))
+        self._writer.append(trace)
+        # stored traces are rare, keep the files consistent after each one
+        self._index_file.flush()
+        self._writer.flush()
+
+    def close(self):
+        self._index_file.close()
+        if self._writer:
+            self._writer.close()
+
+
+SEGMENTS_INDEX_FILE = "index.json"
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+# traces converted to float at a time by export_cwp()
+EXPORT_CHUNK_SIZE = 256
+
+
+class SegmentedTraceWriter:
+    """
+    Writes traces as contiguous segments of at most `segment_bytes` bytes each (at least one trace).
+    Whole segments are written straight from the appended arrays (e.g. slices of a memmap), only the traces of a partial
+    segment are buffered, so memory use stays below `segment_bytes`.
+
+    Layout of `directory`:
+      - `segment_NNNN.npy`: (traces, samples) arrays of `segment_size` traces each (the last one may be shorter).
+      - `index.json`: `{"format": "segmented-npy", "dtype", "samples", "count", "segment_size", "segments": [{"file", "start", "count"}], ...metadata}`.
+        int16 traces are raw ADC values, also listing `int_scale`/`int_offset` (see `traces_to_float()`).
+    """
+    def __init__(self, directory: str, samples: int, dtype: str = "float32", segment_bytes: int = DEFAULT_SEGMENT_BYTES, metadata: Optional[dict[str, Any]] = None):
+        if dtype not in TRACE_DTYPES:
+            raise ValueError("dtype must be one of %s" % str(TRACE_DTYPES))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.samples = samples
+        self.dtype = np.dtype(dtype)
+        self.segment_size = max(1, segment_bytes // (samples * self.dtype.itemsize))
+        self.metadata = metadata if metadata else {}
+        self.count = 0
+        self._segments: list[dict[str, Any]] = []
+        self._buffer: Optional[np.ndarray] = None
+        self._buffered = 0
+
+    def append_chunk(self, traces: np.ndarray):
+        pos = 0
+        while pos < len(traces):
+            if self._buffered == 0 and len(traces) - pos >= self.segment_size:
+                # a whole segment, write it without copying it into the buffer
+                self._save_segment(traces[pos:pos + self.segment_size])
+                pos += self.segment_size
+                continue
+            if self._buffer is None:
+                self._buffer = np.empty((self.segment_size, self.samples), dtype=self.dtype)
+            n = min(len(traces) - pos, self.segment_size - self._buffered)
+            self._buffer[self._buffered:self._buffered + n] = traces[pos:pos + n]
+            self._buffered += n
+            pos += n
+            if self._buffered == self.segment_size:
+                self._write_buffer()
+
+    def _save_segment(self, traces: np.ndarray):
+        filename = "segment_%04d.npy" % len(self._segments)
+        # no copy for traces that already have the right dtype, np.save writes a memmap slice from the mapping
+        np.save(os.path.join(self.directory, filename), np.asarray(traces, dtype=self.dtype))
+        self._segments.append({"file": filename, "start": self.count, "count": len(traces)})
+        self.count += len(traces)
+
+    def _write_buffer(self):
+        if self._buffered == 0:
+            return
+        self._save_segment(self._buffer[:self._buffered])
+        self._buffered = 0
+
+    def close(self) -> str:
+        """
+        Writes the last segment and the index, and returns the index path.
+        """
+        self._write_buffer()
+        self._buffer = None
+        index = dict(self.metadata)
+        index.update({"format": "segmented-npy", "dtype": self.dtype.name, "samples": self.samples, "count": self.count,
+                      "segment_size": self.segment_size, "segments": self._segments})
+        if self.dtype == np.int16:
+            index.update({"int_scale": INT_TRACE_SCALE, "int_offset": INT_TRACE_OFFSET})
+        index_path = os.path.join(self.directory, SEGMENTS_INDEX_FILE)
+        with open(index_path, "w") as f:
+            f.write(json.dumps(index, indent=4))
+        return index_path
+
+
+def write_segmented_traces(traces: np.ndarray, directory: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES, metadata: Optional[dict[str, Any]] = None) -> str:
+    """
+    Writes `traces` (e.g. a TraceMemmapWriter memmap) into a segmented layout, each segment straight from its slice of
+    `traces`. Returns the index path.
+    """
+    if not isinstance(traces, np.ndarray):
+        traces = np.asarray(traces)
+    dtype = "int16" if traces.dtype == np.int16 else "float32"
+    writer = SegmentedTraceWriter(directory, traces.shape[1], dtype, segment_bytes, metadata)
+    writer.append_chunk(traces)
+    return writer.close()
+
+
+def iter_segments(index_path: str):
+    """
+    Yields (start index, memory-mapped traces) for each segment of a segmented trace layout.
+    """
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    directory = os.path.dirname(index_path)
+    for segment in index["segments"]:
+        yield segment["start"], np.load(os.path.join(directory, segment["file"]), mmap_mode="r")
+
+
+def export_cwp(index_path: str, project_path: str) -> str:
+    """
+    Creates a ChipWhisperer project from a segmented trace layout, converting `EXPORT_CHUNK_SIZE` traces at a time from
+    the memory-mapped segments. Returns the project path.
+    """
+    project = cw.create_project(project_path)
+    for start, segment in iter_segments(index_path):
+        for chunk_start in range(0, len(segment), EXPORT_CHUNK_SIZE):
+            waves = traces_to_float(segment[chunk_start:chunk_start + EXPORT_CHUNK_SIZE])
+            for i, wave in enumerate(waves):
+                project.traces.append(cw.Trace(wave, "", "", start + chunk_start + i))
+    project.save()
+    project.close()
+    return project_path + ".cwp"